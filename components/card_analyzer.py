@@ -1,15 +1,22 @@
 import streamlit as st
-from utils.image_processor import analyze_card_image
+from typing import Optional
+from utils.image_processor import analyze_card_image_cached, analyze_card_images
 from utils.market_data import PokemonMarketData
+from utils.card_catalog import get_card_catalog
+from utils.name_matcher import resolve_card_name
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
-def display_market_info(card_name: str):
+def display_market_info(card_name: str, card_id: Optional[str] = None):
     """
-    Display real-time market information for a Pokemon card.
+    Display real-time market information for a Pokemon card, for the exact
+    catalog card when its id is known.
     """
     market_data = PokemonMarketData()
-    result = market_data.get_card_market_data(card_name)
+    if card_id:
+        result = market_data.get_card_market_data_by_id(card_id)
+    else:
+        result = market_data.get_card_market_data(card_name, limit=1)
 
     if not result['success']:
         st.warning(f"Could not fetch market data: {result['error']}")
@@ -20,7 +27,7 @@ def display_market_info(card_name: str):
         """)
         return
 
-    data = result['data']
+    data = result['data'][0]  # Priciest variant
 
     # Display current market data
     col1, col2, col3 = st.columns(3)
@@ -40,7 +47,20 @@ def display_market_info(card_name: str):
 
     st.caption(f"Last updated: {data['last_update']}")
 
-def display_card_analysis(uploaded_file):
+def display_debug_artifacts(debug_info, raw_text=None):
+    """
+    Render the intermediate OCR artifacts returned by analyze_card_image(debug=True).
+    """
+    if not debug_info:
+        return
+
+    with st.expander("OCR Debug Output"):
+        st.image(debug_info['preprocessed_image'], caption="Preprocessed Image (Grayscale)", use_container_width=True)
+        if raw_text is not None:
+            st.write("OCR Detected Lines:", raw_text)
+        st.write("Matched Pokemon keywords:", debug_info['matched_keywords'])
+
+def display_card_analysis(uploaded_file, show_debug=False):
     """
     Display the analysis results for an uploaded Pokemon card image.
     """
@@ -49,10 +69,11 @@ def display_card_analysis(uploaded_file):
 
     with st.spinner('Analyzing Pokemon card image...'):
         # Process the uploaded image
-        analysis_result = analyze_card_image(uploaded_file)
+        analysis_result = analyze_card_image_cached(uploaded_file, debug=show_debug)
 
         if not analysis_result['success']:
             st.error(f"Error analyzing image: {analysis_result['error']}")
+            display_debug_artifacts(analysis_result.get('debug'))
             return
 
         analysis_data = analysis_result['data']
@@ -85,10 +106,29 @@ def display_card_analysis(uploaded_file):
                 for line in analysis_data['text_content']:
                     st.write(line)
 
+            display_debug_artifacts(analysis_result.get('debug'), analysis_data['text_content'])
+
+        # Cards that look like the photo, best match first
+        matches = analysis_data['potential_matches']
+        match_rows = get_card_catalog().get_cards([match['card_id'] for match in matches])
+        matched_cards = [match_rows[match['card_id']] for match in matches if match['card_id'] in match_rows]
+        if matched_cards:
+            st.markdown("### Possible Matches")
+            for card in matched_cards:
+                st.write(f"- {card['name']} ({card['set_name']} #{card['number']})")
+
         # Market Analysis Section
         st.markdown("### Real-Time Market Analysis")
-        if pokemon_info['name']:
-            display_market_info(pokemon_info['name'])
+        # An image match (already within the fingerprint distance threshold)
+        # identifies the exact card; OCR text is only the fallback
+        resolved = resolve_card_name(pokemon_info['name']) if pokemon_info['name'] else None
+        if matched_cards:
+            display_market_info(matched_cards[0]['name'], card_id=matched_cards[0]['id'])
+        elif resolved and resolved['success']:
+            # Only search remotely for names that exist in the catalog
+            display_market_info(resolved['data'])
+        elif resolved:
+            st.warning(f"Could not identify the card: {resolved['error']}")
 
         # Market Trends
         market_data = PokemonMarketData()
@@ -102,7 +142,37 @@ def display_card_analysis(uploaded_file):
             with col1:
                 st.metric("Average Market Price", f"${trend_data['average_price']:.2f}")
                 st.metric("Lowest Price", f"${trend_data['lowest_price']:.2f}")
+                if trend_data.get('median_price') is not None:
+                    st.metric("Median Price", f"${trend_data['median_price']:.2f}")
 
             with col2:
                 st.metric("Highest Price", f"${trend_data['highest_price']:.2f}")
-                st.metric("Total Cards Tracked", trend_data['total_cards'])
\ No newline at end of file
+                st.metric("Total Cards Tracked", trend_data['total_cards'])
+                if trend_data.get('p90_price') is not None:
+                    st.metric("90th Percentile Price", f"${trend_data['p90_price']:.2f}")
+
+def display_batch_analysis(uploaded_files):
+    """
+    Analyze many uploaded card images in parallel, listing each result as it finishes.
+    """
+    if not uploaded_files:
+        return
+
+    st.subheader(f"Scanning {len(uploaded_files)} cards")
+    progress = st.progress(0.0)
+    results_container = st.container()
+
+    identified = 0
+    for completed, (index, result) in enumerate(analyze_card_images(uploaded_files), start=1):
+        progress.progress(completed / len(uploaded_files))
+        file_name = getattr(uploaded_files[index], 'name', f"Image {index + 1}")
+        with results_container:
+            if result['success']:
+                identified += 1
+                resolved = resolve_card_name(result['data']['card_name']) if result['data']['card_name'] else None
+                card_name = resolved['data'] if resolved and resolved['success'] else 'Unknown card'
+                st.write(f"✅ **{file_name}:** {card_name}")
+            else:
+                st.write(f"❌ **{file_name}:** {result['error']}")
+
+    st.caption(f"Identified {identified} of {len(uploaded_files)} cards")
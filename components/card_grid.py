@@ -1,9 +1,10 @@
 import streamlit as st
 from utils.market_data import PokemonMarketData
 
-def display_card(card, card_index):
-    market_data = PokemonMarketData()
-    result = market_data.get_card_market_data(card['name'])
+def display_card(card, card_index, result=None):
+    if result is None:
+        market_data = PokemonMarketData()
+        result = market_data.get_card_market_data(card['name'], limit=1)
 
     with st.container():
         col1, col2 = st.columns([1, 2])
@@ -21,7 +22,7 @@ def display_card(card, card_index):
 
             # Display market data if available
             if result['success']:
-                data = result['data']
+                data = result['data'][0]  # Highest-priced variant
                 col_price, col_trend = st.columns(2)
 
                 with col_price:
@@ -50,28 +51,37 @@ def display_card_grid(cards_df, filters=None):
 
     st.markdown("## Available Cards")
 
+    market_data = PokemonMarketData()
+
     # Display market overview if cards are found
     if not cards_df.empty:
-        market_data = PokemonMarketData()
         trends = market_data.get_market_trends()
 
         if trends['success']:
             st.markdown("### Market Overview")
             trend_data = trends['data']
 
-            col1, col2, col3, col4 = st.columns(4)
+            col1, col2, col3, col4, col5 = st.columns(5)
             with col1:
                 st.metric("Average Price", f"${trend_data['average_price']:.2f}")
             with col2:
-                st.metric("Lowest Price", f"${trend_data['lowest_price']:.2f}")
+                # Only the precomputed aggregates carry quantiles
+                if trend_data.get('median_price') is not None:
+                    st.metric("Median Price", f"${trend_data['median_price']:.2f}")
             with col3:
-                st.metric("Highest Price", f"${trend_data['highest_price']:.2f}")
+                st.metric("Lowest Price", f"${trend_data['lowest_price']:.2f}")
             with col4:
+                st.metric("Highest Price", f"${trend_data['highest_price']:.2f}")
+            with col5:
                 st.metric("Cards Tracked", trend_data['total_cards'])
 
             st.markdown("---")
 
+    # One batched lookup for all distinct names instead of one request per row;
+    # only the top variant of each is shown
+    results = market_data.get_card_market_data_many(cards_df['name'].tolist(), limit=1) if not cards_df.empty else {}
+
     for idx, card in cards_df.iterrows():
         with st.container():
             st.markdown("---")
-            display_card(card, idx)
\ No newline at end of file
+            display_card(card, idx, results.get(card['name']))
\ No newline at end of file
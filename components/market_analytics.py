@@ -1,5 +1,7 @@
 import streamlit as st
 from utils.chart_helpers import create_price_history_chart, create_market_trend_chart
+from utils.price_history import get_price_history_store
+from utils.currency_converter import convert_price_history
 
 def display_market_metrics(metrics):
     st.markdown("## Market Overview")
@@ -30,3 +32,26 @@ def display_market_analysis(price_history_df, cards_df):
     with tab2:
         fig = create_market_trend_chart(cards_df)
         st.plotly_chart(fig, use_container_width=True)
+
+def display_card_price_history(card_id, days=30, currency="USD"):
+    # Precomputed rollups keep long ranges within the chart's point budget
+    history_df = get_price_history_store().get_history(card_id, days=days, resolution="auto")
+
+    if history_df.empty:
+        st.info("No price history recorded for this card yet.")
+        return
+
+    currency_symbol = "$"
+    if currency != "USD":
+        # Each point is converted at the rate of its own day
+        conversion = convert_price_history(history_df, currency)
+        if conversion['success']:
+            history_df = conversion['data']
+            currency_symbol = currency
+            if conversion['unconverted']:
+                st.caption(f"{conversion['unconverted']} points predate the available {currency} rates and are not shown.")
+        else:
+            st.warning(f"Showing USD prices: {conversion['error']}")
+
+    fig = create_price_history_chart(history_df, currency_symbol=currency_symbol)
+    st.plotly_chart(fig, use_container_width=True)
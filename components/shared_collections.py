@@ -1,72 +1,122 @@
+import hashlib
+import json
 import streamlit as st
+from datetime import datetime
 from typing import Dict, List
+from utils.collection_store import get_collection_store, get_collection_write_buffer
+
+COLLECTIONS_PER_PAGE = 10
+LEADERBOARD_SIZE = 5
 
 def initialize_shared_state():
-    """Initialize shared state for user collections"""
-    if 'user_collections' not in st.session_state:
-        st.session_state.user_collections = {}
-    if 'user_ratings' not in st.session_state:
-        st.session_state.user_ratings = {}
-
-def update_user_collection(username: str, cards: List[Dict], total_value: float):
-    """Update a user's collection in shared state"""
-    st.session_state.user_collections[username] = {
-        'cards': cards,
-        'total_value': total_value,
-        'timestamp': st.session_state.get('last_update', 'Just now')
-    }
+    """Initialize per-session state for browsing shared collections"""
+    if 'collections_page' not in st.session_state:
+        st.session_state.collections_page = 1
+
+def _collection_fingerprint(username: str, cards: List[Dict], total_value: float) -> str:
+    """Content hash of what update_user_collection would write"""
+    content = [
+        (card.get('card_id'), card.get('card_name'), card.get('set'), card.get('number'), card.get('current_price'))
+        for card in cards
+    ]
+    payload = json.dumps([username, content, round(float(total_value), 2)], default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+def update_user_collection(username: str, cards: List[Dict], total_value: float) -> bool:
+    """
+    Queue a user's collection for the shared store if it changed since the
+    last call in this session. Returns True when a write was queued.
+    """
+    fingerprint = _collection_fingerprint(username, cards, total_value)
+    if st.session_state.get('collection_fingerprint') == fingerprint:
+        return False
+
+    get_collection_write_buffer().put(
+        username,
+        cards,
+        total_value,
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+    st.session_state.collection_fingerprint = fingerprint
+    return True
 
 def add_rating(from_user: str, to_user: str, rating: int):
     """Add a rating for a user's collection"""
-    if to_user not in st.session_state.user_ratings:
-        st.session_state.user_ratings[to_user] = {}
-    st.session_state.user_ratings[to_user][from_user] = rating
+    get_collection_store().set_rating(from_user, to_user, rating)
 
 def get_average_rating(username: str) -> float:
     """Get average rating for a user's collection"""
-    if username not in st.session_state.user_ratings:
-        return 0.0
-    ratings = st.session_state.user_ratings[username].values()
-    return sum(ratings) / len(ratings) if ratings else 0.0
+    return get_collection_store().get_average_rating(username)
 
 def display_shared_collections(current_user: str):
-    """Display all users' collections with ratings"""
-    if not st.session_state.user_collections:
+    """Display other users' collections with ratings, one page at a time"""
+    store = get_collection_store()
+    total = store.count_collections(exclude_user=current_user)
+    if not total:
         st.info("No other collections to display yet. Be the first to share yours!")
         return
 
     st.markdown("### 🌟 Community Collections")
-    
-    for username, collection in st.session_state.user_collections.items():
-        if username != current_user:  # Don't show current user's collection
-            with st.expander(f"📚 {username}'s Collection"):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.markdown(f"**Total Value:** ${collection['total_value']:.2f}")
-                    st.markdown(f"**Cards:** {len(collection['cards'])}")
-                    st.markdown(f"**Last Updated:** {collection['timestamp']}")
-                
-                with col2:
-                    # Rating system
-                    current_rating = st.session_state.user_ratings.get(username, {}).get(current_user, 0)
-                    new_rating = st.select_slider(
-                        "Rate this collection",
-                        options=[1, 2, 3, 4, 5],
-                        value=current_rating,
-                        key=f"rating_{username}"
-                    )
-                    
-                    if new_rating != current_rating:
-                        add_rating(current_user, username, new_rating)
-                    
+
+    top_rated = store.get_top_rated(LEADERBOARD_SIZE)
+    if top_rated:
+        st.markdown("**🏆 Top Rated:** " + " · ".join(
+            f"{entry['username']} (⭐ {entry['average']:.1f}, {entry['rating_count']} ratings)"
+            for entry in top_rated
+        ))
+
+    page_count = (total + COLLECTIONS_PER_PAGE - 1) // COLLECTIONS_PER_PAGE
+    # Collections may have gone since the page was chosen; the widget rejects
+    # a stored value above its max_value
+    st.session_state.collections_page = max(1, min(st.session_state.get('collections_page', 1), page_count))
+    if page_count > 1:
+        st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            key="collections_page"
+        )
+    page = st.session_state.collections_page
+
+    collections = store.list_collections(
+        exclude_user=current_user,
+        limit=COLLECTIONS_PER_PAGE,
+        offset=(page - 1) * COLLECTIONS_PER_PAGE
+    )
+
+    for collection in collections:
+        username = collection['username']
+        with st.expander(f"📚 {username}'s Collection"):
+            col1, col2 = st.columns([3, 1])
+
+            with col1:
+                st.markdown(f"**Total Value:** ${collection['total_value']:.2f}")
+                st.markdown(f"**Cards:** {collection['card_count']}")
+                st.markdown(f"**Last Updated:** {collection['timestamp']}")
+
+            with col2:
+                # Rating system
+                current_rating = store.get_rating(current_user, username) or 0
+                new_rating = st.select_slider(
+                    "Rate this collection",
+                    options=[0, 1, 2, 3, 4, 5],
+                    value=current_rating,
+                    format_func=lambda r: "Not rated" if r == 0 else str(r),
+                    key=f"rating_{username}"
+                )
+
+                # Averages come back with the page; only re-read after a change
+                avg_rating = collection['average_rating']
+                if new_rating and new_rating != current_rating:
+                    add_rating(current_user, username, new_rating)
                     avg_rating = get_average_rating(username)
-                    st.metric("Average Rating", f"⭐ {avg_rating:.1f}")
-
-                # Show preview of cards
-                if collection['cards']:
-                    st.markdown("**Featured Cards:**")
-                    for i, card in enumerate(collection['cards'][:3]):  # Show first 3 cards
-                        st.markdown(f"- {card['card_name']} (${card['current_price']:.2f})")
-                    if len(collection['cards']) > 3:
-                        st.markdown(f"*...and {len(collection['cards']) - 3} more cards*")
+
+                st.metric("Average Rating", f"⭐ {avg_rating:.1f}")
+
+            # Show preview of cards
+            if collection['cards']:
+                st.markdown("**Featured Cards:**")
+                for i, card in enumerate(collection['cards'][:3]):  # Show first 3 cards
+                    st.markdown(f"- {card['card_name']} (${card['current_price']:.2f})")
+                if len(collection['cards']) > 3:
+                    st.markdown(f"*...and {len(collection['cards']) - 3} more cards*")
@@ -1,6 +1,10 @@
 import streamlit as st
-from utils.market_data import PokemonMarketData
-from utils.currency_converter import get_currency_options, convert_price, format_currency
+import uuid
+from concurrent.futures import CancelledError
+from utils.market_data import MarketDataError, PokemonMarketData
+from utils.async_market_data import get_async_market_data
+from utils.currency_converter import get_currency_options, convert_prices, format_currency
+from utils.card_selection import CardSelection, card_key
 from components.shared_collections import initialize_shared_state, update_user_collection, display_shared_collections
 
 # Page configuration
@@ -38,8 +42,13 @@ if st.session_state.user_name:
     st.markdown("*Info: There are some Pokemon cards we have not got written down!*")
 
     # Initialize session state for selected cards
-    if 'selected_cards' not in st.session_state:
-        st.session_state.selected_cards = []
+    if not isinstance(st.session_state.get('selected_cards'), CardSelection):
+        st.session_state.selected_cards = CardSelection(st.session_state.get('selected_cards'))
+    selection = st.session_state.selected_cards
+
+    # Identifies this browser session so a newer search can cancel a stale one
+    if 'search_scope' not in st.session_state:
+        st.session_state.search_scope = uuid.uuid4().hex
 
     # Search input
     card_name = st.text_input(
@@ -52,18 +61,21 @@ if st.session_state.user_name:
 
     if card_name:
         market_data = PokemonMarketData()
-        result = market_data.get_card_market_data(card_name)
-
-        if result['success']:
-            cards_data = result['data']
-
-            st.markdown(f"### Found {len(cards_data)} variants of {card_name}")
-            st.markdown("---")
-
-            # Create a grid layout for multiple cards
-            cols = st.columns(2)  # Display 2 cards per row
-
-            for idx, card in enumerate(cards_data):
+        engine = get_async_market_data(market_data.api_key)
+
+        # Render variants as their pages arrive instead of after the last page
+        header_placeholder = st.empty()
+        cols = None
+        found = 0
+        error = None
+        try:
+            for idx, card in enumerate(engine.stream_latest(st.session_state.search_scope, card_name)):
+                if cols is None:
+                    st.markdown("---")
+                    # Create a grid layout for multiple cards
+                    cols = st.columns(2)  # Display 2 cards per row
+                found = idx + 1
+                header_placeholder.markdown(f"### Found {found} variants of {card_name}")
                 col = cols[idx % 2]  # Alternate between columns
 
                 with col:
@@ -73,26 +85,10 @@ if st.session_state.user_name:
                         # Checkbox and card title in the same row
                         col_check, col_title = st.columns([1, 4])
                         with col_check:
-                            # Create a unique key using card properties
-                            checkbox_key = f"select_{card['card_name']}_{card['set']}_{card['number']}"
-                            # Check if card is already selected
-                            is_already_selected = any(
-                                selected['card_name'] == card['card_name'] and
-                                selected['set'] == card['set'] and
-                                selected['number'] == card['number']
-                                for selected in st.session_state.selected_cards
-                            )
-                            is_selected = st.checkbox("", key=checkbox_key, value=is_already_selected)
-
-                            if is_selected and not is_already_selected:
-                                st.session_state.selected_cards.append(card)
-                            elif not is_selected and is_already_selected:
-                                st.session_state.selected_cards = [
-                                    c for c in st.session_state.selected_cards
-                                    if not (c['card_name'] == card['card_name'] and
-                                            c['set'] == card['set'] and
-                                            c['number'] == card['number'])
-                                ]
+                            # Create a unique key from the card's stable identity
+                            checkbox_key = f"select_{card_key(card)}"
+                            is_selected = st.checkbox("", key=checkbox_key, value=card in selection)
+                            selection.set_selected(card, is_selected)
 
                         with col_title:
                             st.markdown(f"### {card['card_name']}")
@@ -122,9 +118,16 @@ if st.session_state.user_name:
                             st.metric("Availability", card['availability'])
                         with m3:
                             st.metric("Updated", card['last_update'])
-
-        else:
-            st.error(f"Error fetching card data: {result['error']}")
+        except CancelledError:
+            # The search text changed while this request was in flight
+            st.stop()
+        except MarketDataError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"Error fetching market data: {str(e)}"
+
+        if error or not found:
+            st.error(f"Error fetching card data: {error or 'No market data available for this card'}")
             st.info("""
             Tips:
             - Check the spelling of the card name
@@ -133,7 +136,8 @@ if st.session_state.user_name:
 
     # Update Calculator Section with selected cards (outside the search results)
     with calculator_container:
-        if st.session_state.selected_cards:
+        if selection:
+            selected_cards = selection.cards
             st.markdown("### Selected Cards Calculator")
 
             # Currency selection
@@ -144,12 +148,14 @@ if st.session_state.user_name:
                 format_func=lambda x: f"{x} - {currency_options[x]}"
             )
 
-            # Add personalized message with total in selected currency
-            total_usd = sum(card['current_price'] for card in st.session_state.selected_cards)
-            conversion = convert_price(total_usd, 'USD', selected_currency)
+            # Convert every selected price in one vectorized call
+            usd_prices = [card['current_price'] for card in selected_cards]
+            total_usd = selection.total_usd
+            conversion = convert_prices(usd_prices, 'USD', selected_currency)
 
+            # Add personalized message with total in selected currency
             if conversion['success']:
-                converted_total = format_currency(conversion['amount'], selected_currency)
+                converted_total = format_currency(conversion['amounts'].sum(), selected_currency)
                 st.markdown(f"### Hey {st.session_state.user_name}! Your collection is worth: {converted_total} 💰")
             else:
                 st.markdown(f"### Hey {st.session_state.user_name}! Your collection is worth: ${total_usd:.2f} 💰")
@@ -158,7 +164,7 @@ if st.session_state.user_name:
             # Update shared collections
             update_user_collection(
                 st.session_state.user_name,
-                st.session_state.selected_cards,
+                selected_cards,
                 total_usd
             )
 
@@ -173,13 +179,11 @@ if st.session_state.user_name:
 
             # Display selected cards in a table
             st.markdown("#### Selected Cards:")
-            st.markdown(f"*Total cards selected: {len(st.session_state.selected_cards)}*")
+            st.markdown(f"*Total cards selected: {len(selection)}*")
 
-            for card in st.session_state.selected_cards:
-                # Convert individual card price
-                conversion = convert_price(card['current_price'], 'USD', selected_currency)
+            for card, converted_amount in zip(selected_cards, conversion['amounts']):
                 if conversion['success']:
-                    converted_price = format_currency(conversion['amount'], selected_currency)
+                    converted_price = format_currency(converted_amount, selected_currency)
                     usd_price = format_currency(card['current_price'], 'USD')
                     st.markdown(f"- {card['card_name']} ({card['set']}): {usd_price} ({converted_price})")
                 else:
@@ -187,9 +191,7 @@ if st.session_state.user_name:
 
             # Show total with currency conversion
             st.markdown("---")
-            conversion = convert_price(total_usd, 'USD', selected_currency)
             if conversion['success']:
-                converted_total = format_currency(conversion['amount'], selected_currency)
                 st.markdown(f"""
                 **Total:** ${total_usd:.2f}  
                 **Converted Total:** {converted_total}  
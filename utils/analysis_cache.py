@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from utils.storage import data_path
+
+
+def content_key(image_data: bytes, version: str) -> str:
+    """
+    Cache key for an image: BLAKE2b of its bytes, scoped to a pipeline version.
+    """
+    digest = hashlib.blake2b(image_data, digest_size=20).hexdigest()
+    return f"{version}-{digest}"
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of card analysis results.
+
+    Entries live in an in-memory LRU, and optionally as JSON files in a disk
+    directory so results survive restarts and are shared between processes.
+    The disk tier is kept under max_disk_bytes by deleting the least recently
+    used files (hits touch a file's mtime).
+    """
+
+    def __init__(self, max_entries: int = 256, directory: Optional[str] = None,
+                 max_disk_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Running estimate of the disk tier's size, re-measured on each eviction
+        self._disk_bytes: Optional[int] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if not self.directory:
+            return None
+        try:
+            with open(self._file_path(key)) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._file_path(key))
+        except OSError:
+            pass
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict):
+        self._remember(key, result)
+        if self.directory:
+            tmp_path = f"{self._file_path(key)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(result, f)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, self._file_path(key))
+            except (OSError, TypeError, ValueError):
+                # The disk tier is best-effort
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            self._account_disk(size)
+
+    def _disk_files(self) -> List[os.DirEntry]:
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.name.endswith(".json") and entry.is_file()]
+
+    def _account_disk(self, added: int):
+        if self.max_disk_bytes is None:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry.stat().st_size for entry in self._disk_files())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # Other processes share the directory, so evict from a fresh listing,
+            # oldest first, down to 90% of the cap to avoid evicting on every put
+            files = []
+            for entry in self._disk_files():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            target = self.max_disk_bytes * 0.9
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._disk_bytes = total
+
+    def _remember(self, key: str, result: Dict):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """
+    Return the process-wide analysis cache. SNAPPL_ANALYSIS_CACHE_SIZE sets the
+    in-memory entry limit; SNAPPL_ANALYSIS_CACHE_DISK=0 disables the disk tier,
+    and SNAPPL_ANALYSIS_CACHE_DISK_MB caps its size (default 256).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                use_disk = os.environ.get("SNAPPL_ANALYSIS_CACHE_DISK", "1") != "0"
+                _cache = AnalysisCache(
+                    max_entries=int(os.environ.get("SNAPPL_ANALYSIS_CACHE_SIZE", 256)),
+                    directory=data_path("analysis_cache") if use_disk else None,
+                    max_disk_bytes=int(float(os.environ.get("SNAPPL_ANALYSIS_CACHE_DISK_MB", 256)) * 1024 * 1024)
+                )
+    return _cache
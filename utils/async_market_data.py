@@ -0,0 +1,399 @@
+import asyncio
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.http_client import get_http_session
+from utils.market_aggregates import get_market_aggregates, start_market_aggregation
+from utils.price_history import record_prices
+from utils.market_data import (
+    CARDS_URL,
+    MAX_PAGE_SIZE,
+    MarketDataError,
+    _build_market_trends_result,
+    _invalidate_api_key,
+    _page_cards,
+    _page_params,
+    _parse_card,
+    _plan_card_search,
+)
+
+DEFAULT_CONCURRENCY = int(os.environ.get("POKEMON_TCG_ASYNC_CONCURRENCY", "8"))
+DEFAULT_REQUESTS_PER_SECOND = float(os.environ.get("POKEMON_TCG_REQUESTS_PER_SECOND", "10"))
+
+
+class HostRateLimiter:
+    """
+    Token-bucket rate limiter with one bucket per host.
+    """
+
+    def __init__(self, rate: float = DEFAULT_REQUESTS_PER_SECOND, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+
+    async def acquire(self, host: str):
+        # asyncio primitives are bound to one loop, so locks are kept per loop
+        lock_key = (id(asyncio.get_running_loop()), host)
+        lock = self._locks.setdefault(lock_key, asyncio.Lock())
+        async with lock:
+            while True:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(host, (float(self.burst), now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                await asyncio.sleep((1 - tokens) / self.rate)
+
+
+class AsyncPokemonMarketData:
+    """
+    asyncio counterpart of PokemonMarketData for fan-out and background jobs.
+
+    Requests go through the shared pooled session on an executor sized to the
+    concurrency limit, so hundreds of queued lookups only ever occupy
+    max_concurrency threads and connections.
+    """
+
+    def __init__(self, api_key: Optional[str] = None,
+                 max_concurrency: int = DEFAULT_CONCURRENCY,
+                 requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                 cache_ttl: int = 300,
+                 max_cache_entries: int = 1024):
+        self.api_key = api_key if api_key is not None else os.environ.get("POKEMON_TCG_API_KEY", "")
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="tcg-async")
+        # Keyed by id(loop); the loop is kept alongside so closed loops can be pruned
+        self._semaphores: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+        self._cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # Background loop used by the blocking *_latest helpers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._latest: Dict[str, Tuple[str, Future]] = {}
+        self._latest_lock = threading.Lock()
+
+    async def _get_json(self, params: Dict) -> Dict:
+        """
+        Perform one rate-limited, concurrency-bounded GET against the cards API.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._semaphores.get(id(loop))
+        if entry is None or entry[0] is not loop:
+            for key, (other_loop, _) in list(self._semaphores.items()):
+                if other_loop.is_closed():
+                    self._semaphores.pop(key, None)
+            entry = (loop, asyncio.Semaphore(self.max_concurrency))
+            self._semaphores[id(loop)] = entry
+
+        async with entry[1]:
+            await self.rate_limiter.acquire(urlparse(CARDS_URL).netloc)
+            return await loop.run_in_executor(self._executor, self._get_json_blocking, params)
+
+    def _get_json_blocking(self, params: Dict) -> Dict:
+        # Body decoding stays on the worker thread, off the event loop
+        response = get_http_session().get(
+            CARDS_URL, params=params, headers={"X-Api-Key": self.api_key}
+        )
+        if response.status_code != 200:
+            if response.status_code == 401:
+                _invalidate_api_key(self.api_key)
+            return {"status_code": response.status_code, "data": None, "total_count": 0}
+        data = response.json()
+        return {
+            "status_code": 200,
+            "data": data.get("data", []),
+            "total_count": data.get("totalCount", 0)
+        }
+
+    def _cached(self, key: str) -> Optional[Dict]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: str, result: Dict):
+        if not result["success"]:
+            return
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cache_entries:
+                self._cache.popitem(last=False)
+
+    async def _get_page(self, plan: Dict, page: int) -> Dict:
+        response = await self._get_json(_page_params(plan, page))
+        if response["status_code"] != 200:
+            raise MarketDataError(f"API Error: {response['status_code']}")
+        await asyncio.get_running_loop().run_in_executor(self._executor, record_prices, response["data"])
+        return _page_cards(plan, page, {"data": response["data"], "totalCount": response["total_count"]})
+
+    async def iter_card_market_data(self, card_name: str, limit: Optional[int] = None,
+                                    page_size: int = MAX_PAGE_SIZE,
+                                    prefetch: bool = True) -> AsyncIterator[Dict]:
+        """
+        Async-iterate parsed variants of a card page by page.
+
+        With prefetch=True the next page is requested while the current one
+        is consumed. Raises MarketDataError if a page request fails.
+        """
+        if not self.api_key:
+            raise MarketDataError("Pokemon TCG API key not found. Please check your configuration.")
+
+        if limit is not None:
+            page_size = max(1, min(page_size, limit))
+        plan = _plan_card_search(card_name, page_size)
+        search_name_lower = card_name.lower()
+        yielded = 0
+        page = 1
+        pending = asyncio.ensure_future(self._get_page(plan, page))
+
+        try:
+            while pending is not None:
+                result = await pending
+                has_more = result["has_more"]
+                page += 1
+                pending = None
+                if has_more and prefetch:
+                    pending = asyncio.ensure_future(self._get_page(plan, page))
+
+                for card in result["cards"]:
+                    if card.get("cardmarket") and search_name_lower in card["name"].lower():
+                        yield _parse_card(card)
+                        yielded += 1
+                        if limit is not None and yielded >= limit:
+                            return
+
+                if has_more and pending is None:
+                    pending = asyncio.ensure_future(self._get_page(plan, page))
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def get_card_market_data(self, card_name: str, limit: Optional[int] = None) -> Dict:
+        """
+        Fetch current market data for all variants of a specific Pokemon card.
+        """
+        if not self.api_key:
+            return {
+                "success": False,
+                "error": "Pokemon TCG API key not found. Please check your configuration.",
+                "data": None
+            }
+
+        cache_key = f"card:{card_name.lower()}:{limit}"
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            cards_data = [card async for card in self.iter_card_market_data(card_name, limit=limit)]
+        except asyncio.CancelledError:
+            raise
+        except MarketDataError as e:
+            return {"success": False, "error": str(e), "data": None}
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error fetching market data: {str(e)}",
+                "data": None
+            }
+
+        if not cards_data:
+            return {
+                "success": False,
+                "error": "No market data available for this card",
+                "data": None
+            }
+
+        result = {"success": True, "error": None, "data": cards_data}
+        self._store(cache_key, result)
+        return result
+
+    async def get_card_market_data_many(self, card_names: List[str], limit: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Fetch market data for many names concurrently, keyed by name.
+        """
+        unique_names = sorted({name for name in card_names if name})
+        results = await asyncio.gather(*(self.get_card_market_data(name, limit=limit) for name in unique_names))
+        return dict(zip(unique_names, results))
+
+    async def get_market_trends(self, group_by: Optional[str] = None) -> Dict:
+        """
+        Get overall market trends and statistics, from the precomputed
+        aggregates when available and the remote sample otherwise.
+        """
+        start_market_aggregation()
+        try:
+            summary = await asyncio.get_running_loop().run_in_executor(
+                self._executor, get_market_aggregates().get_summary, group_by
+            )
+        except ValueError as e:
+            return {"success": False, "error": str(e), "data": None}
+        except Exception:
+            summary = None
+        if summary is not None:
+            return {"success": True, "error": None, "data": summary}
+
+        if not self.api_key:
+            return {
+                "success": False,
+                "error": "Pokemon TCG API key not found. Please check your configuration.",
+                "data": None
+            }
+
+        cached = self._cached("trends")
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._get_json({"pageSize": 100, "orderBy": "set.releaseDate"})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error fetching market trends: {str(e)}",
+                "data": None
+            }
+
+        if response["status_code"] != 200:
+            return {
+                "success": False,
+                "error": f"API Error: {response['status_code']}",
+                "data": None
+            }
+
+        result = _build_market_trends_result(response["data"])
+        self._store("trends", result)
+        return result
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True,
+                                 name="tcg-async-loop").start()
+        return self._loop
+
+    def _replace_latest(self, scope: str, key: str, coro, reuse: bool) -> concurrent.futures.Future:
+        """
+        Run coro on the background loop as the current task of scope,
+        cancelling the previous one unless it can be reused.
+        """
+        with self._latest_lock:
+            previous = self._latest.get(scope)
+            # Only join a search that is still running; finished results are
+            # served (or not) by the TTL cache like any other lookup
+            if reuse and previous and previous[0] == key and not previous[1].done():
+                coro.close()
+                return previous[1]
+            if previous:
+                previous[1].cancel()
+            future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+            self._latest[scope] = (key, future)
+        future.add_done_callback(lambda f: self._forget_latest(scope, f))
+        return future
+
+    def _forget_latest(self, scope: str, future: concurrent.futures.Future):
+        # Finished searches leave no per-scope state behind
+        with self._latest_lock:
+            current = self._latest.get(scope)
+            if current and current[1] is future:
+                del self._latest[scope]
+
+    def submit_latest(self, scope: str, card_name: str) -> concurrent.futures.Future:
+        """
+        Schedule a search on the background loop, cancelling any in-flight
+        search for the same scope (e.g. a browser session) whose text differs.
+        """
+        return self._replace_latest(scope, card_name, self.get_card_market_data(card_name), reuse=True)
+
+    def fetch_latest(self, scope: str, card_name: str) -> Dict:
+        """
+        Blocking wrapper around submit_latest() for synchronous callers.
+
+        Raises concurrent.futures.CancelledError if a newer search for the
+        same scope superseded this one.
+        """
+        return self.submit_latest(scope, card_name).result()
+
+    def stream_latest(self, scope: str, card_name: str, limit: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Synchronously yield variants as their pages arrive.
+
+        Starting a new stream for the same scope cancels this one, which then
+        raises concurrent.futures.CancelledError; API failures raise
+        MarketDataError. Completed streams are served from the result cache.
+        """
+        cached = self._cached(f"card:{card_name.lower()}:{limit}")
+        if cached is not None:
+            yield from cached["data"]
+            return
+
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            variants = []
+            try:
+                async for variant in self.iter_card_market_data(card_name, limit=limit):
+                    variants.append(variant)
+                    items.put(variant)
+            except Exception as e:
+                items.put(e)
+                return
+            if variants:
+                self._store(f"card:{card_name.lower()}:{limit}",
+                            {"success": True, "error": None, "data": variants})
+            items.put(done)
+
+        future = self._replace_latest(scope, card_name, pump(), reuse=False)
+        future.add_done_callback(
+            lambda f: f.cancelled() and items.put(concurrent.futures.CancelledError())
+        )
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop fetching pages nobody will read
+            future.cancel()
+
+
+_engines: Dict[str, AsyncPokemonMarketData] = {}
+_engines_lock = threading.Lock()
+
+
+def get_async_market_data(api_key: str) -> AsyncPokemonMarketData:
+    """
+    Return the process-wide async engine for an API key.
+    """
+    with _engines_lock:
+        engine = _engines.get(api_key)
+        if engine is None:
+            engine = _engines[api_key] = AsyncPokemonMarketData(api_key)
+    return engine
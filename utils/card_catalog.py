@@ -0,0 +1,375 @@
+import os
+import sqlite3
+import sys
+import threading
+from typing import Callable, Dict, List, Optional
+
+from utils.http_client import get_http_session
+from utils.price_history import record_prices
+from utils.storage import data_path
+
+CARDS_URL = "https://api.pokemontcg.io/v2/cards"
+SETS_URL = "https://api.pokemontcg.io/v2/sets"
+CATALOG_FIELDS = "id,name,set,number,rarity,supertype,subtypes,artist,images"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    set_id TEXT,
+    set_name TEXT,
+    set_release_date TEXT,
+    number TEXT,
+    rarity TEXT,
+    supertype TEXT,
+    subtypes TEXT,
+    artist TEXT,
+    image_small TEXT,
+    image_large TEXT
+);
+CREATE INDEX IF NOT EXISTS cards_set_id ON cards(set_id);
+CREATE TABLE IF NOT EXISTS sets (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    release_date TEXT,
+    updated_at TEXT,
+    total INTEGER
+);
+CREATE TABLE IF NOT EXISTS http_validators (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+    name, content='cards', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS cards_ai AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_fts(rowid, name) VALUES (new.rowid, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_ad AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_fts(cards_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_au AFTER UPDATE OF name ON cards BEGIN
+    INSERT INTO cards_fts(cards_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+    INSERT INTO cards_fts(rowid, name) VALUES (new.rowid, new.name);
+END;
+"""
+
+_COLUMNS = (
+    "id", "name", "set_id", "set_name", "set_release_date", "number",
+    "rarity", "supertype", "subtypes", "artist", "image_small", "image_large"
+)
+
+
+def _card_row(card: Dict) -> tuple:
+    """Flatten a raw API card into a catalog row."""
+    card_set = card.get("set", {})
+    images = card.get("images", {})
+    return (
+        card["id"],
+        card["name"],
+        card_set.get("id"),
+        card_set.get("name", "Unknown"),
+        card_set.get("releaseDate"),
+        card.get("number", "N/A"),
+        card.get("rarity", "Unknown"),
+        card.get("supertype", "Unknown"),
+        ", ".join(card.get("subtypes", [])),
+        card.get("artist", "Unknown"),
+        images.get("small"),
+        images.get("large"),
+    )
+
+
+class CardCatalog:
+    """
+    Local SQLite catalog of card metadata with a trigram name index.
+
+    Card names, sets and images only change when a set is released, so name
+    searches are answered locally and only prices are fetched remotely.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("SNAPPL_CATALOG_PATH") or data_path("card_catalog.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM cards LIMIT 1").fetchone() is None
+
+    def _upsert_card_rows(self, cards: List[Dict]) -> int:
+        rows = [_card_row(card) for card in cards if card.get("id") and card.get("name")]
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[1:])
+        self._conn.executemany(
+            f"INSERT INTO cards ({', '.join(_COLUMNS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            rows
+        )
+        return len(rows)
+
+    def upsert_cards(self, cards: List[Dict]) -> int:
+        """
+        Insert or update raw API cards in a single transaction.
+        """
+        with self._lock, self._conn:
+            return self._upsert_card_rows(cards)
+
+    def ingest_set(self, card_set: Dict, cards: List[Dict]) -> int:
+        """
+        Store a set and all of its cards in one transaction, so a set is only
+        recorded as synced once every card of it is in the catalog.
+        """
+        with self._lock, self._conn:
+            count = self._upsert_card_rows(cards)
+            self._conn.execute(
+                "INSERT INTO sets (id, name, release_date, updated_at, total) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, release_date = excluded.release_date, "
+                "updated_at = excluded.updated_at, total = excluded.total",
+                (card_set["id"], card_set.get("name"), card_set.get("releaseDate"),
+                 card_set.get("updatedAt"), card_set.get("total"))
+            )
+        return count
+
+    def get_synced_sets(self) -> Dict[str, Optional[str]]:
+        """Return the updatedAt stamp of every ingested set, keyed by set id."""
+        with self._lock:
+            return {row["id"]: row["updated_at"] for row in self._conn.execute("SELECT id, updated_at FROM sets")}
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def get_validators(self, url: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE url = ?", (url,)
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def set_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO http_validators (url, etag, last_modified) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified",
+                (url, etag, last_modified)
+            )
+
+    def search(self, name: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Return catalog rows whose name contains the given text (case-insensitive).
+        """
+        name = name.strip()
+        if not name:
+            return []
+
+        limit_clause = " LIMIT ?" if limit else ""
+        if len(name) >= 3:
+            # Trigram FTS answers substring queries from the index
+            query = (
+                "SELECT cards.* FROM cards_fts JOIN cards ON cards.rowid = cards_fts.rowid "
+                "WHERE cards_fts MATCH ? ORDER BY cards.name, cards.set_release_date DESC"
+            )
+            params = ['"' + name.replace('"', '""') + '"']
+        else:
+            query = (
+                "SELECT * FROM cards WHERE name LIKE ? ESCAPE '\\' "
+                "ORDER BY name, set_release_date DESC"
+            )
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params = [f"%{escaped}%"]
+        if limit:
+            params.append(limit)
+
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query + limit_clause, params)]
+
+    def get_names(self) -> List[str]:
+        """
+        Return every distinct card name in the catalog.
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT name FROM cards ORDER BY name")]
+
+    def get_image_urls(self) -> List[tuple]:
+        """
+        Return (card_id, small image url) for every card that has an image.
+        """
+        with self._lock:
+            return [
+                tuple(row) for row in self._conn.execute(
+                    "SELECT id, image_small FROM cards WHERE image_small IS NOT NULL ORDER BY id"
+                )
+            ]
+
+    def get_cards(self, card_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Return catalog rows keyed by card id.
+        """
+        if not card_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in card_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM cards WHERE id IN ({placeholders})", list(card_ids)
+            ).fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
+
+def catalog_row_to_card(row: Dict) -> Dict:
+    """
+    Convert a catalog row back into the raw API card shape.
+    """
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "set": {"id": row["set_id"], "name": row["set_name"], "releaseDate": row["set_release_date"]},
+        "number": row["number"],
+        "rarity": row["rarity"],
+        "supertype": row["supertype"],
+        "subtypes": [s for s in (row["subtypes"] or "").split(", ") if s],
+        "artist": row["artist"],
+        "images": {"small": row["image_small"], "large": row["image_large"]},
+    }
+
+
+def _fetch_all_pages(url: str, params: Dict, api_key: str, page_size: int = 250,
+                     on_page: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+    """
+    Collect every page of a list endpoint, handing each page to on_page as it
+    arrives. Raises RuntimeError on API errors.
+    """
+    session = get_http_session()
+    results = []
+    page = 1
+    while True:
+        response = session.get(
+            url,
+            params={**params, "page": page, "pageSize": page_size},
+            headers={"X-Api-Key": api_key}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"API Error: {response.status_code}")
+
+        data = response.json()
+        items = data.get("data", [])
+        if on_page is not None:
+            on_page(items)
+        results.extend(items)
+        if not items or page * page_size >= data.get("totalCount", 0):
+            return results
+        page += 1
+
+
+def sync_catalog(api_key: str, catalog: Optional["CardCatalog"] = None, full: bool = False) -> Dict:
+    """
+    Bring the local catalog up to date with the TCG API.
+
+    The set list is requested conditionally (ETag / Last-Modified), and only
+    sets that are newer than the recorded release-date high-water mark,
+    unknown, or whose updatedAt changed have their cards pulled. Each set is
+    written in one bulk transaction. Cards are requested with their market
+    prices, which go to the price history page by page, so market aggregates
+    cover the whole catalog. full=True re-crawls every set.
+    """
+    catalog = catalog or get_card_catalog()
+    headers = {"X-Api-Key": api_key}
+    validators = {} if full else catalog.get_validators(SETS_URL)
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        response = get_http_session().get(
+            SETS_URL,
+            params={"orderBy": "releaseDate", "pageSize": 250},
+            headers=headers
+        )
+        if response.status_code == 304:
+            return {"success": True, "error": None, "synced": 0, "sets": 0}
+        if response.status_code != 200:
+            return {"success": False, "error": f"API Error: {response.status_code}", "synced": 0, "sets": 0}
+
+        data = response.json()
+        sets = data.get("data", [])
+        if len(sets) < data.get("totalCount", 0):
+            sets = _fetch_all_pages(SETS_URL, {"orderBy": "releaseDate"}, api_key)
+
+        high_water_mark = None if full else catalog.get_state("sets_release_date_hwm")
+        known = {} if full else catalog.get_synced_sets()
+        pending = [
+            card_set for card_set in sets
+            if card_set["id"] not in known
+            or known[card_set["id"]] != card_set.get("updatedAt")
+            or (high_water_mark and (card_set.get("releaseDate") or "") > high_water_mark)
+        ]
+
+        synced = 0
+        for card_set in pending:
+            cards = _fetch_all_pages(
+                CARDS_URL,
+                {"q": f'set.id:"{card_set["id"]}"', "select": f"{CATALOG_FIELDS},cardmarket"},
+                api_key,
+                on_page=record_prices
+            )
+            synced += catalog.ingest_set(card_set, cards)
+
+            release_date = card_set.get("releaseDate") or ""
+            if release_date > (high_water_mark or ""):
+                high_water_mark = release_date
+                catalog.set_state("sets_release_date_hwm", high_water_mark)
+    except Exception as e:
+        return {"success": False, "error": f"Sync error: {str(e)}", "synced": 0, "sets": 0}
+
+    # Only remember validators once every changed set has been ingested
+    catalog.set_validators(SETS_URL, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return {"success": True, "error": None, "synced": synced, "sets": len(pending)}
+
+
+_catalog: Optional[CardCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_card_catalog() -> CardCatalog:
+    """
+    Return the process-wide card catalog.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CardCatalog()
+    return _catalog
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.card_catalog sync [--full]
+    if sys.argv[1:2] != ["sync"] or sys.argv[2:] not in ([], ["--full"]):
+        sys.exit("usage: python -m utils.card_catalog sync [--full]")
+    result = sync_catalog(os.environ.get("POKEMON_TCG_API_KEY", ""), full="--full" in sys.argv)
+    if not result["success"]:
+        sys.exit(result["error"])
+    print(f"Synced {result['synced']} cards from {result['sets']} new or changed sets")
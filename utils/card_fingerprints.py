@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.card_catalog import CardCatalog, get_card_catalog
+from utils.http_client import get_http_session
+from utils.storage import data_path
+
+# Matches further than this many differing bits (of 128) are not reported
+MAX_MATCH_DISTANCE = 40
+DOWNLOAD_WORKERS = 8
+
+
+def dhash(gray: np.ndarray) -> np.uint64:
+    """
+    64-bit difference hash: the sign of horizontal gradients on a 9x8 thumbnail.
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def phash(gray: np.ndarray) -> np.uint64:
+    """
+    64-bit perceptual hash: low DCT frequencies of a 32x32 thumbnail against their median.
+    """
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def fingerprint(gray: np.ndarray) -> np.ndarray:
+    """
+    Fingerprint of a grayscale card image as [dhash, phash].
+    """
+    return np.array([dhash(gray), phash(gray)], dtype=np.uint64)
+
+
+class FingerprintIndex:
+    """
+    Card image fingerprints held as one (n, 2) uint64 array.
+
+    Matching XORs the query against every row and counts bits, so a lookup
+    over the whole catalog is a couple of vectorized passes.
+    """
+
+    def __init__(self, card_ids: Optional[np.ndarray] = None, hashes: Optional[np.ndarray] = None):
+        self.card_ids = np.asarray(card_ids if card_ids is not None else [], dtype=str)
+        self.hashes = np.asarray(hashes if hashes is not None else np.empty((0, 2)), dtype=np.uint64).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    def match(self, query: np.ndarray, limit: int = 5,
+              max_distance: int = MAX_MATCH_DISTANCE) -> List[Dict]:
+        """
+        Return up to `limit` closest cards as {"card_id", "distance"}, nearest first.
+        """
+        if not len(self):
+            return []
+        distances = np.bitwise_count(self.hashes ^ query).sum(axis=1, dtype=np.int32)
+        limit = min(limit, len(distances))
+        nearest = np.argpartition(distances, limit - 1)[:limit]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [
+            {"card_id": str(self.card_ids[i]), "distance": int(distances[i])}
+            for i in nearest if distances[i] <= max_distance
+        ]
+
+    def merged(self, card_ids: List[str], hashes: List[np.ndarray]) -> "FingerprintIndex":
+        """
+        Return an index with the given fingerprints added or replaced.
+        """
+        if not card_ids:
+            return self
+        keep = ~np.isin(self.card_ids, card_ids)
+        return FingerprintIndex(
+            np.concatenate([self.card_ids[keep], np.asarray(card_ids, dtype=str)]),
+            np.concatenate([self.hashes[keep], np.asarray(hashes, dtype=np.uint64).reshape(-1, 2)])
+        )
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, card_ids=self.card_ids, hashes=self.hashes)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FingerprintIndex":
+        with np.load(path) as data:
+            return cls(data["card_ids"], data["hashes"])
+
+
+def _index_path() -> str:
+    return os.environ.get("SNAPPL_FINGERPRINT_PATH") or data_path("card_fingerprints.npz")
+
+
+_index: Optional[FingerprintIndex] = None
+_index_mtime: Optional[float] = None
+_index_lock = threading.Lock()
+
+
+def fingerprint_index_version() -> str:
+    """
+    Identify the index on disk, so results that used it can be invalidated on rebuild.
+    """
+    try:
+        return str(os.path.getmtime(_index_path()))
+    except OSError:
+        return "none"
+
+
+def get_fingerprint_index() -> Optional[FingerprintIndex]:
+    """
+    Return the fingerprint index on disk (reloaded when rebuilt), or None if
+    it has not been built yet.
+    """
+    global _index, _index_mtime
+    path = _index_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = FingerprintIndex.load(path)
+            _index_mtime = mtime
+    return _index
+
+
+def match_card_image(gray: np.ndarray, limit: int = 5) -> List[Dict]:
+    """
+    Rank catalog cards by visual similarity to a (perspective-corrected) card image.
+    """
+    index = get_fingerprint_index()
+    if index is None:
+        return []
+    return index.match(fingerprint(gray), limit=limit)
+
+
+def _fingerprint_url(url: str) -> Optional[np.ndarray]:
+    try:
+        response = get_http_session().get(url)
+        if response.status_code != 200:
+            return None
+        gray = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_GRAYSCALE)
+        return fingerprint(gray) if gray is not None else None
+    except Exception:
+        return None
+
+
+def build_fingerprint_index(catalog: Optional[CardCatalog] = None, full: bool = False) -> Dict:
+    """
+    Fingerprint catalog card images that are not yet in the index.
+
+    Images are downloaded on a small thread pool over the shared HTTP session;
+    full=True re-fingerprints every card.
+    """
+    catalog = catalog or get_card_catalog()
+    path = _index_path()
+    index = FingerprintIndex() if full or not os.path.exists(path) else FingerprintIndex.load(path)
+
+    known = set(index.card_ids.tolist())
+    pending = [(card_id, url) for card_id, url in catalog.get_image_urls() if card_id not in known]
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        hashes = list(executor.map(_fingerprint_url, [url for _, url in pending]))
+
+    added = [(card_id, h) for (card_id, _), h in zip(pending, hashes) if h is not None]
+    index = index.merged([card_id for card_id, _ in added], [h for _, h in added])
+    index.save(path)
+    return {"success": True, "error": None, "added": len(added), "failed": len(pending) - len(added)}
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.card_fingerprints build [--full]
+    if sys.argv[1:2] != ["build"] or sys.argv[2:] not in ([], ["--full"]):
+        sys.exit("usage: python -m utils.card_fingerprints build [--full]")
+    result = build_fingerprint_index(full="--full" in sys.argv)
+    print(f"Fingerprinted {result['added']} card images ({result['failed']} failed)")
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from typing import Dict, List
+
+
+def card_key(card: Dict) -> str:
+    """
+    Stable identity of a card: the TCG card id, or name/set/number for cards
+    that came from somewhere without one.
+    """
+    if card.get('card_id'):
+        return card['card_id']
+    return f"{card.get('card_name')}|{card.get('set')}|{card.get('number')}"
+
+
+class CardSelection:
+    """
+    Cards picked by the user, in selection order.
+
+    Membership, add and remove are O(1), and the USD total is kept in step
+    with every change (in integer cents, so it never drifts).
+    """
+
+    def __init__(self, cards: List[Dict] = None):
+        self._cards: "OrderedDict[str, Dict]" = OrderedDict()
+        self._total_cents = 0
+        for card in cards or []:
+            self.add(card)
+
+    @staticmethod
+    def _cents(card: Dict) -> int:
+        return round(float(card.get('current_price') or 0) * 100)
+
+    def __contains__(self, card: Dict) -> bool:
+        return card_key(card) in self._cards
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __bool__(self) -> bool:
+        return bool(self._cards)
+
+    def add(self, card: Dict):
+        key = card_key(card)
+        previous = self._cards.get(key)
+        if previous is not None:
+            self._total_cents -= self._cents(previous)
+        self._cards[key] = card
+        self._total_cents += self._cents(card)
+
+    def remove(self, card: Dict):
+        previous = self._cards.pop(card_key(card), None)
+        if previous is not None:
+            self._total_cents -= self._cents(previous)
+
+    def set_selected(self, card: Dict, selected: bool):
+        if selected:
+            if card not in self:
+                self.add(card)
+        else:
+            self.remove(card)
+
+    @property
+    def cards(self) -> List[Dict]:
+        """Selected cards in the order they were picked"""
+        return list(self._cards.values())
+
+    @property
+    def total_usd(self) -> float:
+        return self._total_cents / 100
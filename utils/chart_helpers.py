@@ -1,8 +1,98 @@
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
-def create_price_history_chart(df):
+MAX_POINTS_PER_TRACE = 2000
+
+def downsample_lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each bucket, the point forming
+    the largest triangle with its neighbours, so spikes survive. Returns the
+    selected indices.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_start = end if i + 2 < len(edges) else n - 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+def downsample_minmax(y, n_buckets):
+    """
+    Min/max bucketing: keep the lowest and highest point of each bucket.
+    Returns the selected indices in order.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        indices.extend(sorted({start + int(np.argmin(bucket)), start + int(np.argmax(bucket))}))
+    return np.asarray(indices, dtype=np.int64)
+
+def create_price_history_chart(df, max_points=MAX_POINTS_PER_TRACE, currency_symbol="$"):
+    # Rollup frames carry each bucket's high/low, drawn as a band around the close
+    has_range = 'high' in df and 'low' in df
+    if len(df) > max_points:
+        if has_range:
+            # Keep the buckets holding the extremes so the band doesn't lose spikes
+            df = df.iloc[np.union1d(
+                downsample_minmax(df['high'].fillna(0), max_points // 4),
+                downsample_minmax(df['low'].fillna(0), max_points // 4)
+            )]
+        else:
+            x = df['date'].astype('int64') if hasattr(df['date'], 'dt') else df['date']
+            df = df.iloc[downsample_lttb(x, df['price'].fillna(0), max_points)]
+
     fig = go.Figure()
+    if has_range:
+        fig.add_trace(
+            go.Scatter(
+                x=df['date'],
+                y=df['low'],
+                mode='lines',
+                name='Low',
+                line=dict(width=0),
+                hoverinfo='skip'
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=df['date'],
+                y=df['high'],
+                mode='lines',
+                name='High',
+                line=dict(width=0),
+                fill='tonexty',
+                fillcolor='rgba(255, 75, 75, 0.2)'
+            )
+        )
     fig.add_trace(
         go.Scatter(
             x=df['date'],
@@ -16,7 +106,7 @@ def create_price_history_chart(df):
     fig.update_layout(
         title="Price History",
         xaxis_title="Date",
-        yaxis_title="Price ($)",
+        yaxis_title=f"Price ({currency_symbol})",
         template="plotly_white",
         hovermode="x unified",
         showlegend=False,
@@ -0,0 +1,308 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from utils.storage import data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    username TEXT PRIMARY KEY,
+    cards TEXT NOT NULL,
+    card_count INTEGER NOT NULL,
+    total_value REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS collections_updated_at ON collections(updated_at);
+CREATE TABLE IF NOT EXISTS ratings (
+    to_user TEXT NOT NULL,
+    from_user TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    PRIMARY KEY (to_user, from_user)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ratings_from_user ON ratings(from_user);
+CREATE TABLE IF NOT EXISTS rating_totals (
+    username TEXT PRIMARY KEY,
+    rating_sum INTEGER NOT NULL,
+    rating_count INTEGER NOT NULL,
+    average REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rating_totals_leaderboard ON rating_totals(average DESC, rating_count DESC);
+"""
+
+
+class CollectionStore(ABC):
+    """
+    Storage interface for community collections and ratings.
+
+    Implementations must be safe to share between sessions and processes;
+    SQLiteCollectionStore is the default, and other backends (e.g. a server
+    database) can be plugged in with register_collection_backend().
+    """
+
+    @abstractmethod
+    def upsert_collection(self, username: str, cards: List[Dict], total_value: float,
+                          updated_at: Optional[str] = None):
+        ...
+
+    def upsert_collections(self, rows: List[tuple]):
+        """
+        Write several (username, cards, total_value, updated_at) rows; backends
+        that can batch should override this.
+        """
+        for row in rows:
+            self.upsert_collection(*row)
+
+    @abstractmethod
+    def get_collection(self, username: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def list_collections(self, exclude_user: Optional[str] = None,
+                         limit: int = 10, offset: int = 0) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def count_collections(self, exclude_user: Optional[str] = None) -> int:
+        ...
+
+    @abstractmethod
+    def set_rating(self, from_user: str, to_user: str, rating: int):
+        ...
+
+    @abstractmethod
+    def get_rating(self, from_user: str, to_user: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def get_average_rating(self, username: str) -> float:
+        ...
+
+    @abstractmethod
+    def get_top_rated(self, limit: int = 5) -> List[Dict]:
+        ...
+
+
+class SQLiteCollectionStore(CollectionStore):
+    """
+    SQLite-backed store; WAL mode lets several server processes share the file.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("SNAPPL_COLLECTIONS_DB") or data_path("collections.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row_to_collection(row: sqlite3.Row) -> Dict:
+        return {
+            "username": row["username"],
+            "cards": json.loads(row["cards"]),
+            "card_count": row["card_count"],
+            "total_value": row["total_value"],
+            "timestamp": row["updated_at"],
+            "average_rating": row["average"] or 0.0,
+        }
+
+    def upsert_collection(self, username: str, cards: List[Dict], total_value: float,
+                          updated_at: Optional[str] = None):
+        self.upsert_collections([(username, cards, total_value, updated_at)])
+
+    def upsert_collections(self, rows: List[tuple]):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        params = [
+            (username, json.dumps(cards, default=str), len(cards), float(total_value), updated_at or now)
+            for username, cards, total_value, updated_at in rows
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO collections (username, cards, card_count, total_value, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(username) DO UPDATE SET "
+                "cards = excluded.cards, card_count = excluded.card_count, "
+                "total_value = excluded.total_value, updated_at = excluded.updated_at",
+                params
+            )
+
+    def get_collection(self, username: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT collections.*, rating_totals.average FROM collections "
+                "LEFT JOIN rating_totals ON rating_totals.username = collections.username "
+                "WHERE collections.username = ?", (username,)
+            ).fetchone()
+        return self._row_to_collection(row) if row else None
+
+    def list_collections(self, exclude_user: Optional[str] = None,
+                         limit: int = 10, offset: int = 0) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collections.*, rating_totals.average FROM collections "
+                "LEFT JOIN rating_totals ON rating_totals.username = collections.username "
+                "WHERE collections.username IS NOT ? "
+                "ORDER BY collections.updated_at DESC, collections.username LIMIT ? OFFSET ?",
+                (exclude_user, limit, offset)
+            ).fetchall()
+        return [self._row_to_collection(row) for row in rows]
+
+    def count_collections(self, exclude_user: Optional[str] = None) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM collections WHERE username IS NOT ?", (exclude_user,)
+            ).fetchone()[0]
+
+    def set_rating(self, from_user: str, to_user: str, rating: int):
+        """
+        Upsert a rating and apply its delta to the running totals in the same
+        transaction, so averages never need a scan over all raters.
+        """
+        rating = int(rating)
+        with self._lock, self._conn:
+            # Take the write lock before reading the old rating
+            self._conn.execute("BEGIN IMMEDIATE")
+            old = self._conn.execute(
+                "SELECT rating FROM ratings WHERE to_user = ? AND from_user = ?", (to_user, from_user)
+            ).fetchone()
+            if old is not None and old["rating"] == rating:
+                return
+
+            self._conn.execute(
+                "INSERT INTO ratings (to_user, from_user, rating) VALUES (?, ?, ?) "
+                "ON CONFLICT(to_user, from_user) DO UPDATE SET rating = excluded.rating",
+                (to_user, from_user, rating)
+            )
+            sum_delta = rating - (old["rating"] if old is not None else 0)
+            count_delta = 0 if old is not None else 1
+            self._conn.execute(
+                "INSERT INTO rating_totals (username, rating_sum, rating_count, average) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET "
+                "rating_sum = rating_sum + ?, rating_count = rating_count + ?, "
+                "average = CAST(rating_sum + ? AS REAL) / (rating_count + ?)",
+                (to_user, rating, 1, float(rating), sum_delta, count_delta, sum_delta, count_delta)
+            )
+
+    def get_rating(self, from_user: str, to_user: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rating FROM ratings WHERE to_user = ? AND from_user = ?", (to_user, from_user)
+            ).fetchone()
+        return row["rating"] if row else None
+
+    def get_average_rating(self, username: str) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT average FROM rating_totals WHERE username = ?", (username,)
+            ).fetchone()
+        return float(row["average"]) if row else 0.0
+
+    def get_top_rated(self, limit: int = 5) -> List[Dict]:
+        """Best-rated collections, read straight off the leaderboard index."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username, average, rating_count FROM rating_totals "
+                "ORDER BY average DESC, rating_count DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_BACKENDS: Dict[str, Callable[[], CollectionStore]] = {"sqlite": SQLiteCollectionStore}
+
+
+def register_collection_backend(name: str, factory: Callable[[], CollectionStore]):
+    """
+    Make a storage backend selectable through SNAPPL_COLLECTIONS_BACKEND.
+    """
+    _BACKENDS[name] = factory
+
+
+_store: Optional[CollectionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_collection_store() -> CollectionStore:
+    """
+    Return the process-wide collection store for the configured backend.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.environ.get("SNAPPL_COLLECTIONS_BACKEND", "sqlite")
+                _store = _BACKENDS[backend]()
+    return _store
+
+
+class CollectionWriteBuffer:
+    """
+    Coalesces collection writes and flushes them to the store on an interval.
+
+    Only the latest pending write per user is kept, so a burst of edits costs
+    one upsert per user per flush instead of one per edit.
+    """
+
+    def __init__(self, interval: Optional[float] = None,
+                 store_factory: Callable[[], CollectionStore] = get_collection_store):
+        self.interval = float(interval if interval is not None
+                              else os.environ.get("SNAPPL_COLLECTIONS_FLUSH_INTERVAL", 5))
+        self._store_factory = store_factory
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, username: str, cards: List[Dict], total_value: float,
+            updated_at: Optional[str] = None):
+        with self._lock:
+            self._pending[username] = (username, list(cards), total_value, updated_at)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="collection-flush", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """
+        Write every pending collection now; returns how many were written.
+        """
+        with self._lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+        if not rows:
+            return 0
+        try:
+            self._store_factory().upsert_collections(rows)
+        except Exception:
+            # Requeue unless a newer write for the same user arrived meanwhile
+            with self._lock:
+                for row in rows:
+                    self._pending.setdefault(row[0], row)
+            raise
+        return len(rows)
+
+    def _run(self):
+        while not self._wake.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+_write_buffer: Optional[CollectionWriteBuffer] = None
+
+
+def get_collection_write_buffer() -> CollectionWriteBuffer:
+    """
+    Return the process-wide write buffer; pending writes are flushed at exit.
+    """
+    global _write_buffer
+    if _write_buffer is None:
+        with _store_lock:
+            if _write_buffer is None:
+                _write_buffer = CollectionWriteBuffer()
+                atexit.register(_write_buffer.flush)
+    return _write_buffer
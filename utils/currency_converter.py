@@ -1,56 +1,452 @@
-import requests
-import streamlit as st
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
 import time
+from utils.http_client import get_http_session
+from utils.storage import data_path
 
-@st.cache_data(ttl=3600)  # Cache exchange rates for 1 hour
-def fetch_exchange_rates(base_currency: str = "USD", max_retries: int = 3) -> Dict:
+try:
+    from zoneinfo import ZoneInfo
+    _ECB_TZ = ZoneInfo("Europe/Berlin")
+except Exception:
+    _ECB_TZ = timezone(timedelta(hours=1))
+
+# Frankfurter republishes ECB reference rates around 16:00 CET on business days
+RATES_PUBLISH_TIME = dt_time(16, 15)
+# Minimum gap between refresh attempts while rates are stale (e.g. holidays)
+REFRESH_RETRY_INTERVAL = 15 * 60
+# How long a cold start with nothing cached may wait for the first fetch
+COLD_START_TIMEOUT = float(os.environ.get("SNAPPL_RATES_COLD_START_TIMEOUT", "3"))
+
+_rates_cache: Dict[str, Dict] = {}
+_refresh_threads: Dict[str, threading.Thread] = {}
+_last_refresh_attempt: Dict[str, float] = {}
+_rates_lock = threading.Lock()
+
+def _rates_path(base_currency: str) -> str:
+    return data_path(f"exchange_rates_{base_currency}.json")
+
+def _load_rates_from_disk(base_currency: str) -> Optional[Dict]:
+    try:
+        with open(_rates_path(base_currency)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_rates_to_disk(base_currency: str, entry: Dict):
+    path = _rates_path(base_currency)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+
+def _next_publication(rates_date: str) -> datetime:
     """
-    Fetch exchange rates from Frankfurter API with retry mechanism
+    First publication time after the given rates date: the next business
+    day at RATES_PUBLISH_TIME, Frankfurt time.
     """
-    for attempt in range(max_retries):
+    day = datetime.strptime(rates_date, "%Y-%m-%d").date() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, RATES_PUBLISH_TIME, tzinfo=_ECB_TZ)
+
+def _last_published_date() -> str:
+    """
+    Date of the newest rates that are out: today once RATES_PUBLISH_TIME has
+    passed on a business day, otherwise the previous business day.
+    """
+    now = datetime.now(_ECB_TZ)
+    day = now.date() if now.time() >= RATES_PUBLISH_TIME else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+def _is_stale(entry: Dict) -> bool:
+    try:
+        return datetime.now(timezone.utc) >= _next_publication(entry["date"])
+    except (KeyError, TypeError, ValueError):
+        return True
+
+def _refresh_rates(base_currency: str):
+    result = _fetch_exchange_rates_remote(base_currency)
+    if result["success"]:
+        entry = {"rates": result["rates"], "date": result["date"], "fetched_at": time.time()}
+        with _rates_lock:
+            _rates_cache[base_currency] = entry
         try:
-            # Use Frankfurter API which is free and requires no API key
-            response = requests.get(
-                f"https://api.frankfurter.app/latest",
-                params={"from": base_currency},
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("rates"):
-                    return {
-                        "success": True,
-                        "rates": data["rates"],
-                        "date": data.get("date", datetime.now().strftime("%Y-%m-%d")),
-                        "error": None
-                    }
-
-            # If we get here, something went wrong with the response
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait before retrying
-                continue
+            _save_rates_to_disk(base_currency, entry)
+        except OSError:
+            pass
 
-            return {
-                "success": False,
-                "rates": {},
-                "date": None,
-                "error": f"API Error: Status {response.status_code}"
-            }
+def _start_refresh(base_currency: str) -> threading.Thread:
+    """
+    Start a background refresh unless one is already running (single flight).
+    """
+    with _rates_lock:
+        thread = _refresh_threads.get(base_currency)
+        if thread is not None and thread.is_alive():
+            return thread
+        _last_refresh_attempt[base_currency] = time.monotonic()
+        thread = threading.Thread(
+            target=_refresh_rates, args=(base_currency,),
+            daemon=True, name=f"rates-refresh-{base_currency}"
+        )
+        _refresh_threads[base_currency] = thread
+        thread.start()
+        return thread
+
+def fetch_exchange_rates(base_currency: str = "USD", max_retries: int = 3) -> Dict:
+    """
+    Return exchange rates without putting Frankfurter on the request path.
+
+    Rates are kept in memory and on disk with their publication date. Once a
+    newer publication is due, the cached rates are still returned immediately
+    ("stale": True) while a background thread refreshes them. Only a cold
+    start with nothing cached waits, at most COLD_START_TIMEOUT seconds, and
+    only when no refresh is running or was tried in the last
+    REFRESH_RETRY_INTERVAL; otherwise it fails fast. max_retries is kept for
+    compatibility: retries follow the shared HTTP session's policy.
+    """
+    with _rates_lock:
+        entry = _rates_cache.get(base_currency)
+    if entry is None:
+        entry = _load_rates_from_disk(base_currency)
+        if entry is not None:
+            with _rates_lock:
+                entry = _rates_cache.setdefault(base_currency, entry)
 
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait before retrying
-                continue
+    if entry is None:
+        # During an outage, don't spawn a fetch and block on every request
+        with _rates_lock:
+            thread = _refresh_threads.get(base_currency)
+            running = thread is not None and thread.is_alive()
+            last_attempt = _last_refresh_attempt.get(base_currency, float("-inf"))
+        if not running and time.monotonic() - last_attempt >= REFRESH_RETRY_INTERVAL:
+            _start_refresh(base_currency).join(COLD_START_TIMEOUT)
+        with _rates_lock:
+            entry = _rates_cache.get(base_currency)
+        if entry is None:
             return {
                 "success": False,
                 "rates": {},
                 "date": None,
-                "error": f"Connection error: {str(e)}"
+                "error": "Exchange rates are not available yet, please try again shortly"
             }
 
+    stale = _is_stale(entry)
+    if stale:
+        last_attempt = _last_refresh_attempt.get(base_currency, float("-inf"))
+        if time.monotonic() - last_attempt >= REFRESH_RETRY_INTERVAL:
+            _start_refresh(base_currency)
+
+    return {
+        "success": True,
+        "rates": entry["rates"],
+        "date": entry["date"],
+        "fetched_at": entry.get("fetched_at"),
+        "stale": stale,
+        "error": None
+    }
+
+def _fetch_exchange_rates_remote(base_currency: str = "USD") -> Dict:
+    """
+    Fetch exchange rates from Frankfurter API over the shared session, which
+    retries transient failures with backoff.
+    """
+    try:
+        # Use Frankfurter API which is free and requires no API key
+        response = get_http_session().get(
+            "https://api.frankfurter.app/latest",
+            params={"from": base_currency}
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("rates"):
+                return {
+                    "success": True,
+                    "rates": data["rates"],
+                    "date": data.get("date", datetime.now().strftime("%Y-%m-%d")),
+                    "error": None
+                }
+
+        return {
+            "success": False,
+            "rates": {},
+            "date": None,
+            "error": f"API Error: Status {response.status_code}"
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "rates": {},
+            "date": None,
+            "error": f"Connection error: {str(e)}"
+        }
+
+class RateTable:
+    """
+    Exchange rates against a single base currency held as a NumPy vector.
+
+    Any cross rate is derived from the base as rate[to] / rate[from], so one
+    fetch serves every currency pair.
+    """
+
+    def __init__(self, rates: Dict[str, float], base: str = "USD", date: Optional[str] = None):
+        self.base = base
+        self.date = date
+        self.currencies = [base] + sorted(code for code in rates if code != base)
+        self._index = {code: i for i, code in enumerate(self.currencies)}
+        self.rates = np.array([1.0] + [rates[code] for code in self.currencies[1:]], dtype=float)
+
+    def __contains__(self, currency: str) -> bool:
+        return currency in self._index
+
+    def rate(self, from_currency: str, to_currency: str) -> float:
+        """Cross rate from one currency to another. Raises KeyError if unknown."""
+        return float(self.rates[self._index[to_currency]] / self.rates[self._index[from_currency]])
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        return amount * self.rate(from_currency, to_currency)
+
+    def convert_many(self, amounts: Sequence[float], from_currency: str, to_currency: str) -> np.ndarray:
+        """Convert a whole column of amounts in one vectorized multiply."""
+        return np.asarray(amounts, dtype=float) * self.rate(from_currency, to_currency)
+
+_rate_table: Optional[RateTable] = None
+_rate_table_key = None
+
+def get_rate_table() -> Dict:
+    """
+    Return the shared USD-based rate table, rebuilt only when new rates land.
+    """
+    global _rate_table, _rate_table_key
+    rates = fetch_exchange_rates("USD")
+    if not rates["success"]:
+        return {"success": False, "table": None, "error": rates["error"]}
+
+    key = (rates["date"], rates["fetched_at"])
+    if key != _rate_table_key:
+        _rate_table = RateTable(rates["rates"], base="USD", date=rates["date"])
+        _rate_table_key = key
+    return {"success": True, "table": _rate_table, "error": None}
+
+class RateHistory:
+    """
+    Dated exchange rates against one base currency.
+
+    Rates are a (dates x currencies) array aligned with a sorted datetime64[D]
+    vector, so looking up the rate for every row of a price history is a
+    single searchsorted. Dates without a publication (weekends, holidays) use
+    the most recent earlier one; dates before the first publication have no
+    rate (NaN).
+    """
+
+    def __init__(self, dates: np.ndarray, currencies: List[str], matrix: np.ndarray,
+                 base: str = "USD", fetched_from: Optional[str] = None,
+                 fetched_through: Optional[str] = None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.currencies = list(currencies)
+        self.matrix = np.asarray(matrix, dtype=float).reshape(len(self.dates), len(self.currencies))
+        self.base = base
+        self.fetched_from = fetched_from
+        self.fetched_through = fetched_through
+        self._index = {code: i for i, code in enumerate(self.currencies)}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def covers(self, start: str, end: str) -> bool:
+        return (self.fetched_from is not None and self.fetched_from <= start
+                and self.fetched_through is not None and self.fetched_through >= end)
+
+    def _rates_for(self, currency: str, positions: np.ndarray) -> np.ndarray:
+        if currency == self.base:
+            return np.ones(len(positions))
+        return self.matrix[positions, self._index[currency]]
+
+    def rates_on(self, dates: Sequence, from_currency: str, to_currency: str) -> np.ndarray:
+        """
+        Cross rate in effect on each date, NaN before the first publication.
+        Raises KeyError if unknown.
+        """
+        if not len(self.dates):
+            raise KeyError(to_currency)
+        wanted = np.asarray(pd.to_datetime(pd.Series(dates)).values.astype("datetime64[D]"))
+        positions = np.searchsorted(self.dates, wanted, side="right") - 1
+        before_history = positions < 0
+        positions = np.maximum(positions, 0)
+        rates = self._rates_for(to_currency, positions) / self._rates_for(from_currency, positions)
+        rates[before_history] = np.nan
+        return rates
+
+    def merged(self, other: "RateHistory") -> "RateHistory":
+        """Combine two histories of the same base; other wins on overlapping dates."""
+        currencies = sorted(set(self.currencies) | set(other.currencies))
+        dates = np.union1d(self.dates, other.dates)
+        matrix = np.full((len(dates), len(currencies)), np.nan)
+        for history in (self, other):
+            rows = np.searchsorted(dates, history.dates)
+            cols = [currencies.index(code) for code in history.currencies]
+            matrix[np.ix_(rows, cols)] = history.matrix
+        return RateHistory(
+            dates, currencies, matrix, self.base,
+            fetched_from=min(filter(None, [self.fetched_from, other.fetched_from]), default=None),
+            fetched_through=max(filter(None, [self.fetched_through, other.fetched_through]), default=None)
+        )
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path, dates=self.dates.astype("int64"), currencies=np.array(self.currencies),
+            matrix=self.matrix, meta=np.array([self.base, self.fetched_from or "", self.fetched_through or ""])
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RateHistory":
+        with np.load(path) as data:
+            base, fetched_from, fetched_through = data["meta"].tolist()
+            return cls(data["dates"].astype("datetime64[D]"), data["currencies"].tolist(), data["matrix"],
+                       base, fetched_from or None, fetched_through or None)
+
+def _rate_history_path(base_currency: str) -> str:
+    return data_path(f"rate_history_{base_currency}.npz")
+
+def _fetch_rate_history_remote(start: str, end: str, base_currency: str) -> RateHistory:
+    """
+    Fetch a Frankfurter time series, one request per year so the API
+    returns daily rather than sampled data.
+    """
+    histories = []
+    chunk_start = datetime.strptime(start, "%Y-%m-%d").date()
+    final = datetime.strptime(end, "%Y-%m-%d").date()
+    while chunk_start <= final:
+        chunk_end = min(chunk_start + timedelta(days=364), final)
+        response = get_http_session().get(
+            f"https://api.frankfurter.app/{chunk_start.isoformat()}..{chunk_end.isoformat()}",
+            params={"from": base_currency}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"API Error: Status {response.status_code}")
+
+        series = response.json().get("rates", {})
+        dates = sorted(series)
+        currencies = sorted({code for day in series.values() for code in day})
+        matrix = np.array(
+            [[series[day].get(code, np.nan) for code in currencies] for day in dates], dtype=float
+        )
+        histories.append(RateHistory(
+            np.array(dates, dtype="datetime64[D]"), currencies, matrix, base_currency,
+            fetched_from=chunk_start.isoformat(), fetched_through=chunk_end.isoformat()
+        ))
+        chunk_start = chunk_end + timedelta(days=1)
+
+    history = histories[0]
+    for other in histories[1:]:
+        history = history.merged(other)
+    return history
+
+_rate_histories: Dict[str, RateHistory] = {}
+_rate_history_lock = threading.Lock()
+
+def fetch_rate_history(start: str, end: str, base_currency: str = "USD") -> Dict:
+    """
+    Return dated rates covering [start, end] (YYYY-MM-DD).
+
+    Rates are kept locally (memory and data/rate_history_<base>.npz); only
+    the part of the range not fetched before is requested from Frankfurter.
+    The range stops at the newest published rates, so a day is never marked
+    fetched before its rates are out.
+    """
+    end = min(end, _last_published_date())
+    start = min(start, end)
+
+    with _rate_history_lock:
+        history = _rate_histories.get(base_currency)
+        if history is None:
+            try:
+                history = RateHistory.load(_rate_history_path(base_currency))
+            except (OSError, ValueError, KeyError):
+                history = None
+            if history is not None:
+                _rate_histories[base_currency] = history
+
+    if history is not None and history.covers(start, end):
+        return {"success": True, "history": history, "error": None}
+
+    # Fetched without holding the lock, so one slow request doesn't stall other lookups
+    try:
+        # Only the missing head and tail of the range go over the network
+        missing = [(start, end)] if history is None else [
+            (start, history.fetched_from) if start < history.fetched_from else None,
+            (history.fetched_through, end) if end > history.fetched_through else None,
+        ]
+        fetched = [
+            _fetch_rate_history_remote(segment[0], segment[1], base_currency)
+            for segment in filter(None, missing)
+        ]
+    except Exception as e:
+        return {"success": False, "history": history, "error": f"Connection error: {str(e)}"}
+
+    with _rate_history_lock:
+        # Merge into whatever is current now, which another thread may have extended
+        history = _rate_histories.get(base_currency, history)
+        for segment in fetched:
+            history = segment if history is None else history.merged(segment)
+        _rate_histories[base_currency] = history
+        try:
+            history.save(_rate_history_path(base_currency))
+        except OSError:
+            pass
+    return {"success": True, "history": history, "error": None}
+
+PRICE_COLUMNS = ("price", "open", "high", "low", "close", "avg7", "avg30", "trend_price")
+
+def convert_price_history(df: pd.DataFrame, to_currency: str, from_currency: str = "USD",
+                          date_column: str = "date") -> Dict:
+    """
+    Convert a price-history frame at each row's own daily rate.
+
+    All price columns present (see PRICE_COLUMNS) are converted with one
+    vectorized as-of join against the local rate history. Rows dated before
+    the first available rate are left NaN with converted=False, and counted
+    in "unconverted".
+    """
+    if from_currency == to_currency or df.empty:
+        return {"success": True, "data": df, "unconverted": 0, "error": None}
+
+    dates = pd.to_datetime(df[date_column])
+    start = dates.min().strftime("%Y-%m-%d")
+    end = min(dates.max(), pd.Timestamp.now()).strftime("%Y-%m-%d")
+    result = fetch_rate_history(start, end, "USD")
+    if not result["success"]:
+        return {"success": False, "data": df, "error": result["error"]}
+
+    try:
+        rates = result["history"].rates_on(dates, from_currency, to_currency)
+    except KeyError as e:
+        return {"success": False, "data": df, "error": f"Currency {e.args[0]} not found in exchange rates"}
+
+    # Rows older than the rate history stay unconverted (NaN) rather than
+    # borrowing a later day's rate
+    converted = df.copy()
+    for column in PRICE_COLUMNS:
+        if column in converted:
+            converted[column] = converted[column].to_numpy(dtype=float) * rates
+    converted["converted"] = ~np.isnan(rates)
+    return {
+        "success": True,
+        "data": converted,
+        "unconverted": int(np.isnan(rates).sum()),
+        "error": None
+    }
+
 def get_currency_options() -> Dict[str, str]:
     """
     Returns an expanded list of currency options with their descriptions
@@ -90,30 +486,64 @@ def convert_price(amount: float, from_currency: str, to_currency: str) -> Dict:
             "date": datetime.now().strftime("%Y-%m-%d")
         }
 
-    rates = fetch_exchange_rates(from_currency)
-    if not rates["success"]:
+    result = get_rate_table()
+    if not result["success"]:
         return {
             "success": False,
             "amount": amount,
-            "error": rates["error"]
+            "error": result["error"]
         }
 
+    table = result["table"]
     try:
-        conversion_rate = rates["rates"][to_currency]
-        converted_amount = amount * conversion_rate
+        conversion_rate = table.rate(from_currency, to_currency)
         return {
             "success": True,
-            "amount": converted_amount,
+            "amount": amount * conversion_rate,
             "rate": conversion_rate,
-            "date": rates["date"]
+            "date": table.date
         }
-    except KeyError:
+    except KeyError as e:
         return {
             "success": False,
             "amount": amount,
-            "error": f"Currency {to_currency} not found in exchange rates"
+            "error": f"Currency {e.args[0]} not found in exchange rates"
         }
 
+def convert_prices(amounts: Sequence[float], from_currency: str, to_currency: str) -> Dict:
+    """
+    Convert many prices at once; same result shape as convert_price with
+    "amounts" as a NumPy array.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    if from_currency == to_currency:
+        return {
+            "success": True,
+            "amounts": amounts,
+            "rate": 1.0,
+            "date": datetime.now().strftime("%Y-%m-%d")
+        }
+
+    result = get_rate_table()
+    if not result["success"]:
+        return {"success": False, "amounts": amounts, "error": result["error"]}
+
+    table = result["table"]
+    try:
+        conversion_rate = table.rate(from_currency, to_currency)
+    except KeyError as e:
+        return {
+            "success": False,
+            "amounts": amounts,
+            "error": f"Currency {e.args[0]} not found in exchange rates"
+        }
+    return {
+        "success": True,
+        "amounts": amounts * conversion_rate,
+        "rate": conversion_rate,
+        "date": table.date
+    }
+
 def format_currency(amount: float, currency: str) -> str:
     """
     Format currency amount with proper symbol and decimals
@@ -1,47 +1,60 @@
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-
-def generate_card_data(num_cards=50):
-    card_names = [
-        "Blue-Eyes White Dragon", "Black Lotus", "Charizard", "Pikachu",
-        "Dark Magician", "Mox Pearl", "Time Walk", "Blastoise",
-        "Red-Eyes Black Dragon", "Ancestral Recall", "Mewtwo", "Venusaur"
-    ]
-    
-    conditions = ["Mint", "Near Mint", "Excellent", "Good", "Poor"]
-    sets = ["Base Set", "Alpha", "Beta", "Unlimited", "1st Edition"]
-    
-    data = []
-    for _ in range(num_cards):
-        name = np.random.choice(card_names)
-        condition = np.random.choice(conditions)
-        card_set = np.random.choice(sets)
-        
-        base_price = np.random.uniform(100, 10000)
-        current_price = base_price * (1 + np.random.uniform(-0.2, 0.2))
-        
-        data.append({
-            "name": name,
-            "condition": condition,
-            "set": card_set,
-            "price": round(current_price, 2),
-            "last_sold": datetime.now() - timedelta(days=np.random.randint(1, 30)),
-            "market_trend": np.random.choice(["↑", "↓", "→"]),
-            "popularity_score": np.random.randint(1, 100),
-            "available_quantity": np.random.randint(1, 50)
-        })
-    
-    return pd.DataFrame(data)
-
-def generate_price_history(days=30):
+from datetime import datetime
+
+CARD_NAMES = np.array([
+    "Blue-Eyes White Dragon", "Black Lotus", "Charizard", "Pikachu",
+    "Dark Magician", "Mox Pearl", "Time Walk", "Blastoise",
+    "Red-Eyes Black Dragon", "Ancestral Recall", "Mewtwo", "Venusaur"
+], dtype=object)
+CONDITIONS = np.array(["Mint", "Near Mint", "Excellent", "Good", "Poor"], dtype=object)
+SETS = np.array(["Base Set", "Alpha", "Beta", "Unlimited", "1st Edition"], dtype=object)
+TRENDS = np.array(["↑", "↓", "→"], dtype=object)
+
+def _card_columns(rng, num_cards, now):
+    # One draw per column; categorical fields are index draws into fixed arrays
+    base_price = rng.uniform(100, 10000, num_cards)
+    current_price = base_price * (1 + rng.uniform(-0.2, 0.2, num_cards))
+
+    return pd.DataFrame({
+        "name": CARD_NAMES[rng.integers(0, len(CARD_NAMES), num_cards)],
+        "condition": CONDITIONS[rng.integers(0, len(CONDITIONS), num_cards)],
+        "set": SETS[rng.integers(0, len(SETS), num_cards)],
+        "price": np.round(current_price, 2),
+        "last_sold": now - pd.to_timedelta(rng.integers(1, 30, num_cards), unit="D"),
+        "market_trend": TRENDS[rng.integers(0, len(TRENDS), num_cards)],
+        "popularity_score": rng.integers(1, 100, num_cards),
+        "available_quantity": rng.integers(1, 50, num_cards)
+    })
+
+def generate_card_data(num_cards=50, seed=None):
+    rng = np.random.default_rng(seed)
+    return _card_columns(rng, num_cards, pd.Timestamp(datetime.now()))
+
+def generate_card_data_chunks(num_cards, chunk_size=100_000, seed=None):
+    """
+    Yield generate_card_data-shaped frames of at most chunk_size rows,
+    drawn from one seeded generator so the stream is reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.now())
+    for start in range(0, num_cards, chunk_size):
+        chunk = _card_columns(rng, min(chunk_size, num_cards - start), now)
+        chunk.index += start
+        yield chunk
+
+def generate_price_history(days=30, seed=None):
+    rng = np.random.default_rng(seed)
     dates = pd.date_range(end=datetime.now(), periods=days)
-    prices = [100]
-    for _ in range(days-1):
-        change = np.random.uniform(-5, 5)
-        new_price = max(prices[-1] * (1 + change/100), 10)
-        prices.append(new_price)
-    
+
+    # Random walk from 100 with a floor of 10, as p[t] = max(p[t-1] * (1 + change), 10).
+    # In log space the floor is a reflection, so the clamped walk is the free
+    # walk shifted up by the running maximum of how far it dipped below it.
+    changes = rng.uniform(-5, 5, max(days - 1, 0))
+    free_walk = np.log(100) + np.concatenate(([0.0], np.cumsum(np.log1p(changes / 100))))
+    shortfall = np.maximum.accumulate(np.maximum(np.log(10) - free_walk, 0))
+    prices = np.exp(free_walk + shortfall)[:days]
+
     return pd.DataFrame({
         "date": dates,
         "price": prices
@@ -0,0 +1,134 @@
+import os
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = int(os.environ.get("SNAPPL_HTTP_POOL_SIZE", "20"))
+DEFAULT_TIMEOUT = float(os.environ.get("SNAPPL_HTTP_TIMEOUT", "10"))
+DEFAULT_RETRIES = int(os.environ.get("SNAPPL_HTTP_RETRIES", "3"))
+DEFAULT_BACKOFF = float(os.environ.get("SNAPPL_HTTP_BACKOFF", "0.5"))
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "new_connections": 0}
+
+
+def _record(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _record("new_connections")
+        return super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _record("new_connections")
+        return super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTP adapter with a default timeout and connection counters.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        _record("requests")
+        return super().send(request, **kwargs)
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE,
+                   timeout: float = DEFAULT_TIMEOUT,
+                   retries: int = DEFAULT_RETRIES,
+                   backoff_factor: float = DEFAULT_BACKOFF) -> requests.Session:
+    """
+    Create a keep-alive session with connection pooling and retry/backoff.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = PooledHTTPAdapter(
+        timeout=timeout,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the process-wide shared session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure_http_session(**kwargs) -> requests.Session:
+    """
+    Replace the shared session, e.g. to change pool size or timeouts.
+    """
+    global _session
+    with _session_lock:
+        old, _session = _session, create_session(**kwargs)
+    if old is not None:
+        old.close()
+    return _session
+
+
+def get_connection_stats() -> Dict:
+    """
+    Return request and connection counters for the shared session.
+    """
+    with _stats_lock:
+        total = _stats["requests"]
+        new = _stats["new_connections"]
+    return {
+        "requests": total,
+        "new_connections": new,
+        "reused_connections": max(total - new, 0),
+    }
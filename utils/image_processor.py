@@ -1,38 +1,80 @@
 import cv2
 import numpy as np
+import os
 import pytesseract
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from PIL import Image
+import hashlib
 import io
-import streamlit as st
+import json
+import re
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from utils.analysis_cache import content_key, get_analysis_cache
+from utils.card_fingerprints import fingerprint_index_version, match_card_image
 
-def is_pokemon_card(text_content):
+# Canonical size of a perspective-corrected card (63 x 88 mm aspect ratio)
+CARD_WIDTH, CARD_HEIGHT = 600, 838
+
+# Regions OCR'd on a corrected card, as (left, top, right, bottom) fractions,
+# with the Tesseract page segmentation mode suited to each
+CARD_REGIONS = {
+    'name': ((0.05, 0.025, 0.68, 0.095), 7),
+    'hp': ((0.62, 0.025, 0.95, 0.095), 7),
+    'attacks': ((0.05, 0.53, 0.95, 0.86), 6),
+}
+
+# Photos are decoded no larger than this on their long side; a located card is
+# warped down to CARD_WIDTH x CARD_HEIGHT anyway
+MAX_IMAGE_DIMENSION = 2000
+
+# A contour must cover this share of the photo to be taken as the card
+MIN_CARD_AREA_RATIO = 0.1
+
+POKEMON_KEYWORDS = [
+    'hp', 'pokemon', 'trainer', 'energy',
+    'evolves', 'attack', 'weakness',
+    'retreat', 'stage', 'basic',
+    'damage', 'effect', 'power'
+]
+
+# Bump when the pipeline changes in a way the settings above don't capture
+PIPELINE_REVISION = 1
+
+def pipeline_version() -> str:
     """
-    Check if the card is a Pokemon card based on text content.
+    Version of everything that shapes an analysis result, for cache keys.
     """
-    pokemon_keywords = [
-        'hp', 'pokemon', 'trainer', 'energy',
-        'evolves', 'attack', 'weakness',
-        'retreat', 'stage', 'basic',
-        'damage', 'effect', 'power'
-    ]
+    config = {
+        'revision': PIPELINE_REVISION,
+        'card_size': (CARD_WIDTH, CARD_HEIGHT),
+        'regions': CARD_REGIONS,
+        'max_image_dimension': MAX_IMAGE_DIMENSION,
+        'min_card_area': MIN_CARD_AREA_RATIO,
+        'keywords': POKEMON_KEYWORDS,
+        'fingerprints': fingerprint_index_version(),
+    }
+    return hashlib.blake2b(json.dumps(config, sort_keys=True).encode(), digest_size=8).hexdigest()
 
-    # Debug output
+def match_pokemon_keywords(text_content):
+    """
+    Return the Pokemon-related keywords found in the text lines.
+    """
     text_lower = ' '.join(text_content).lower()
-    st.write("Detected text:", text_lower)
-
-    # Count matches
-    matches = []
-    for keyword in pokemon_keywords:
-        if keyword in text_lower:
-            matches.append(keyword)
+    return [keyword for keyword in POKEMON_KEYWORDS if keyword in text_lower]
 
-    st.write("Matched Pokemon keywords:", matches)
-
-    return len(matches) >= 1  # Relaxed condition - need at least 1 Pokemon-related keyword
+def is_pokemon_card(text_content):
+    """
+    Check if the card is a Pokemon card based on text content.
+    """
+    return len(match_pokemon_keywords(text_content)) >= 1  # Relaxed condition - need at least 1 Pokemon-related keyword
 
-def extract_pokemon_info(text_lines):
+def extract_pokemon_info(text_lines, regions=None):
     """
     Extract Pokemon-specific information from text lines.
+
+    When region-tagged text from a located card is available (see
+    ocr_card_regions), fields are read from their own regions; otherwise
+    they are guessed from the whole-image lines.
     """
     info = {
         'name': '',
@@ -42,6 +84,13 @@ def extract_pokemon_info(text_lines):
         'other_text': []
     }
 
+    if regions:
+        info['name'] = regions.get('name', [''])[0] if regions.get('name') else ''
+        hp_match = re.search(r'\d+', ' '.join(regions.get('hp', [])))
+        info['hp'] = hp_match.group(0) if hp_match else ''
+        info['attacks'] = list(regions.get('attacks', []))
+        return info
+
     for line in text_lines:
         line_lower = line.lower()
         if 'hp' in line_lower:
@@ -62,128 +111,325 @@ def extract_pokemon_info(text_lines):
 
     return info
 
+def decode_grayscale(image_bytes):
+    """
+    Decode an uploaded image into a grayscale array no larger than
+    MAX_IMAGE_DIMENSION on its long side.
+    """
+    if isinstance(image_bytes, (bytes, bytearray)):
+        image_bytes = io.BytesIO(image_bytes)
+    image_bytes.seek(0)
+
+    with Image.open(image_bytes) as pil_image:
+        # JPEGs decode straight to grayscale at a reduced scale (1/2 .. 1/8),
+        # so a 48 MP photo never exists in memory at full size
+        pil_image.draft('L', (MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+        gray = pil_image if pil_image.mode == 'L' else pil_image.convert('L')
+        gray.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.Resampling.BOX)
+        return np.asarray(gray)
+
+def binarize_image(gray):
+    """
+    Threshold and dilate a grayscale image for OCR.
+    """
+    # Apply thresholding to preprocess the image
+    gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+    # Apply dilation to connect text components
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
+    return cv2.dilate(gray, kernel, iterations=1)
+
 def preprocess_image(image_bytes):
     """
     Preprocess the uploaded image for better OCR results.
     """
     try:
-        # First try reading with PIL
-        image_bytes.seek(0)
-        pil_image = Image.open(image_bytes)
-
-        # Convert PIL image to numpy array
-        image_array = np.array(pil_image)
+        return binarize_image(decode_grayscale(image_bytes)), None
+    except Exception as e:
+        return None, str(e)
 
-        # Convert RGB to BGR (if needed)
-        if len(image_array.shape) == 3 and image_array.shape[2] == 3:
-            image = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-        else:
-            image = image_array
+def _order_corners(points):
+    """
+    Order four corners as top-left, top-right, bottom-right, bottom-left,
+    turning landscape quads so the card comes out portrait.
+    """
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    ordered = np.array([
+        points[np.argmin(sums)], points[np.argmin(diffs)],
+        points[np.argmax(sums)], points[np.argmax(diffs)]
+    ])
+    width = np.linalg.norm(ordered[1] - ordered[0])
+    height = np.linalg.norm(ordered[3] - ordered[0])
+    if width > height:
+        ordered = np.roll(ordered, -1, axis=0)
+    return ordered
 
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def find_card_quad(gray):
+    """
+    Locate the card in a photo as four ordered corner points, or None.
+    """
+    scale = 1000 / max(gray.shape)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    scale = min(scale, 1)
 
-        # Apply thresholding to preprocess the image
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        # Apply dilation to connect text components
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-        gray = cv2.dilate(gray, kernel, iterations=1)
+    min_area = MIN_CARD_AREA_RATIO * small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            return _order_corners(approx) / scale
+    return None
 
-        # Debug output - show preprocessed image
-        st.image(gray, caption="Preprocessed Image (Grayscale)", use_container_width=True)
+def warp_card(gray, quad):
+    """
+    Perspective-correct the card to the canonical CARD_WIDTH x CARD_HEIGHT.
+    """
+    target = np.array([
+        [0, 0], [CARD_WIDTH - 1, 0],
+        [CARD_WIDTH - 1, CARD_HEIGHT - 1], [0, CARD_HEIGHT - 1]
+    ], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(quad.astype(np.float32), target)
+    return cv2.warpPerspective(gray, matrix, (CARD_WIDTH, CARD_HEIGHT), flags=cv2.INTER_AREA)
 
-        return gray, None
-    except Exception as e:
-        st.error(f"Detailed error in preprocessing: {str(e)}")
-        return None, str(e)
+def ocr_card_regions(card):
+    """
+    OCR only the name bar, HP and attack block of a corrected card.
+    """
+    regions = {}
+    for region, ((left, top, right, bottom), psm) in CARD_REGIONS.items():
+        roi = card[int(top * CARD_HEIGHT):int(bottom * CARD_HEIGHT), int(left * CARD_WIDTH):int(right * CARD_WIDTH)]
+        roi = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        text = pytesseract.image_to_string(roi, config=f'--oem 3 --psm {psm}')
+        regions[region] = [line.strip() for line in text.split('\n') if line.strip()]
+    return regions
 
-def extract_card_text(image_bytes):
+def extract_card_text(image_bytes, debug=False):
     """
     Extract text from card image using OCR.
+
+    With debug=True the result also carries a 'debug' dict with the
+    preprocessed image and the matched keywords, for display by the caller.
+    'potential_matches' holds catalog cards that look like the located card,
+    which needs no OCR and is filled in even when text extraction fails; it
+    stays empty when no card outline is found.
     """
+    potential_matches = []
     try:
-        # Preprocess the image
-        processed_image, error = preprocess_image(image_bytes)
-        if error:
+        try:
+            gray = decode_grayscale(image_bytes)
+        except Exception as e:
             return {
                 'card_name': '',
                 'raw_text': [],
                 'success': False,
-                'error': f"Image preprocessing failed: {error}"
+                'error': f"Image preprocessing failed: {str(e)}"
             }
 
-        # Extract text using pytesseract with custom configuration
-        custom_config = r'--oem 3 --psm 6'  # Assume uniform text layout
-        text = pytesseract.image_to_string(processed_image, config=custom_config)
+        # OCR just the regions that matter when the card can be located
+        quad = find_card_quad(gray)
+        if quad is not None:
+            processed_image = warp_card(gray, quad)
+            # Fingerprints only compare meaningfully on a perspective-corrected card;
+            # a whole photo with background would yield confident-looking noise
+            potential_matches = match_card_image(processed_image)
+            regions = ocr_card_regions(processed_image)
+            filtered_lines = [line for lines in regions.values() for line in lines]
+        else:
+            # Fall back to the whole photo
+            processed_image = binarize_image(gray)
+            regions = None
+            custom_config = r'--oem 3 --psm 6'  # Assume uniform text layout
+            text = pytesseract.image_to_string(processed_image, config=custom_config)
 
-        # Process the extracted text
-        lines = text.split('\n')
-        filtered_lines = [line.strip() for line in lines if line.strip()]
+            # Process the extracted text
+            lines = text.split('\n')
+            filtered_lines = [line.strip() for line in lines if line.strip()]
 
-        # Debug output
-        st.write("OCR Detected Lines:", filtered_lines)
+        keywords = match_pokemon_keywords(filtered_lines)
+        debug_info = {
+            'preprocessed_image': processed_image,
+            'card_quad': quad,
+            'regions': regions,
+            'matched_keywords': keywords
+        } if debug else None
 
         # Validate if it's a Pokemon card
-        if not is_pokemon_card(filtered_lines):
+        if not keywords:
             return {
                 'card_name': '',
                 'raw_text': filtered_lines,
                 'success': False,
-                'error': "The uploaded image does not appear to be a Pokemon card"
+                'error': "The uploaded image does not appear to be a Pokemon card",
+                'potential_matches': potential_matches,
+                'debug': debug_info
             }
 
         # Extract Pokemon-specific information
-        pokemon_info = extract_pokemon_info(filtered_lines)
+        pokemon_info = extract_pokemon_info(filtered_lines, regions)
 
         return {
             'card_name': pokemon_info['name'],
             'raw_text': filtered_lines,
             'pokemon_info': pokemon_info,
+            'potential_matches': potential_matches,
             'success': True,
-            'error': None
+            'error': None,
+            'debug': debug_info
         }
     except Exception as e:
-        st.error(f"Error in text extraction: {str(e)}")
         return {
             'card_name': '',
             'raw_text': [],
+            'potential_matches': potential_matches,
             'success': False,
             'error': str(e)
         }
 
-def analyze_card_image(image_bytes):
+def analyze_card_image(image_bytes, debug=False):
     """
     Analyze the Pokemon card image and extract relevant information.
+
+    The pipeline has no UI side effects, so it can run in worker processes;
+    pass debug=True to get the intermediate artifacts under result['debug'].
     """
     try:
         # Extract text from the image
-        ocr_result = extract_card_text(image_bytes)
+        ocr_result = extract_card_text(image_bytes, debug=debug)
+        potential_matches = ocr_result.get('potential_matches', [])
 
-        if not ocr_result['success']:
+        # A fingerprint match identifies the card even when OCR could not
+        if not ocr_result['success'] and not potential_matches:
             return {
                 'success': False,
                 'error': ocr_result['error'],
-                'data': None
+                'data': None,
+                'debug': ocr_result.get('debug')
             }
 
         # Basic analysis of the extracted text
         analysis = {
             'card_name': ocr_result['card_name'],
             'text_content': ocr_result['raw_text'],
-            'pokemon_info': ocr_result.get('pokemon_info', {}),
-            'potential_matches': []  # Will be populated with database matches
+            'pokemon_info': ocr_result.get('pokemon_info') or extract_pokemon_info([]),
+            'potential_matches': potential_matches  # Catalog card ids ranked by image similarity
         }
 
         return {
             'success': True,
             'error': None,
-            'data': analysis
+            'data': analysis,
+            'debug': ocr_result.get('debug')
         }
     except Exception as e:
-        st.error(f"Error in card analysis: {str(e)}")
         return {
             'success': False,
             'error': str(e),
             'data': None
-        }
\ No newline at end of file
+        }
+
+def _read_image_bytes(image) -> bytes:
+    """
+    Accept raw bytes, a path, or a file-like object (e.g. a Streamlit upload).
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, 'rb') as f:
+            return f.read()
+    image.seek(0)
+    return image.read()
+
+def analyze_card_image_cached(image, debug=False) -> Dict:
+    """
+    analyze_card_image behind the content-addressed analysis cache, so an
+    image that was already scanned costs no OCR. Debug runs bypass the cache.
+    """
+    image_data = _read_image_bytes(image)
+    if debug:
+        return analyze_card_image(io.BytesIO(image_data), debug=True)
+
+    cache = get_analysis_cache()
+    key = content_key(image_data, pipeline_version())
+    result = cache.get(key)
+    if result is None:
+        result = analyze_card_image(io.BytesIO(image_data))
+        # Failures may be environmental (e.g. no Tesseract), so only successes are kept
+        if result['success']:
+            cache.put(key, result)
+    return result
+
+def _analyze_card_bytes(image_data: bytes) -> Dict:
+    # Worker entry point: only bytes cross the process boundary
+    return analyze_card_image(io.BytesIO(image_data))
+
+def analyze_card_images(images: Iterable, max_workers: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    Analyze many card images in a process pool, yielding (index, result) pairs
+    in completion order as each image finishes.
+
+    Images are read lazily with at most two per worker in flight, so a whole
+    binder scan or folder is never held in memory at once. Images already in
+    the analysis cache are answered without reaching the pool.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    image_iter = enumerate(images)
+    cache = get_analysis_cache()
+    version = pipeline_version()
+    # Started on the first cache miss, so a fully cached batch spawns no workers
+    executor = None
+    in_flight = {}
+    keys = {}
+
+    def submit_next() -> bool:
+        nonlocal executor
+        try:
+            index, image = next(image_iter)
+        except StopIteration:
+            return False
+        try:
+            image_data = _read_image_bytes(image)
+            key = content_key(image_data, version)
+            cached = cache.get(key)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+            else:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                future = executor.submit(_analyze_card_bytes, image_data)
+                keys[future] = key
+            in_flight[future] = index
+        except OSError as e:
+            # Unreadable input: report it in order with the other results
+            failed = Future()
+            failed.set_exception(e)
+            in_flight[failed] = index
+        return True
+
+    try:
+        while len(in_flight) < max_workers * 2 and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                key = keys.pop(future, None)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'success': False, 'error': str(e), 'data': None}
+                if key and result['success']:
+                    cache.put(key, result)
+                yield index, result
+                submit_next()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,341 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.card_catalog import CardCatalog, get_card_catalog
+from utils.price_history import PriceHistoryStore, get_price_history_store
+from utils.storage import data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS market_latest (
+    card_id TEXT PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    price REAL NOT NULL,
+    set_name TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    supertype TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS market_latest_price ON market_latest(price);
+CREATE INDEX IF NOT EXISTS market_latest_set ON market_latest(set_name, price);
+CREATE INDEX IF NOT EXISTS market_latest_rarity ON market_latest(rarity, price);
+CREATE INDEX IF NOT EXISTS market_latest_supertype ON market_latest(supertype, price);
+CREATE TABLE IF NOT EXISTS market_summaries (
+    group_by TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min_price REAL,
+    max_price REAL,
+    sketch TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (group_by, group_key)
+);
+CREATE TABLE IF NOT EXISTS aggregation_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+# group_by name -> market_latest column; "all" is the whole market
+GROUP_COLUMNS = {"set": "set_name", "rarity": "rarity", "supertype": "supertype"}
+UNKNOWN_GROUP = "Unknown"
+CATALOG_CHUNK = 500
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch) with relative accuracy `alpha`.
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is within alpha of the true value, the sketch stays a few
+    hundred buckets for the whole price range, and removing a value is as
+    cheap as adding one.
+    """
+
+    def __init__(self, alpha: float = 0.01, bins: Optional[Dict[int, int]] = None, zero_count: int = 0):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = dict(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, values, weight: int = 1):
+        values = np.asarray(values, dtype=float)
+        positive = values[values > 0]
+        self.zero_count += weight * int(values.size - positive.size)
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            total = self.bins.get(key, 0) + weight * count
+            if total > 0:
+                self.bins[key] = total
+            else:
+                self.bins.pop(key, None)
+
+    def remove(self, values):
+        self.add(values, weight=-1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        count = self.count
+        if not count:
+            return None
+        rank = q * (count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({"alpha": self.alpha, "zero": self.zero_count, "bins": self.bins})
+
+    @classmethod
+    def from_json(cls, text: str) -> "QuantileSketch":
+        data = json.loads(text)
+        return cls(data["alpha"], {int(key): count for key, count in data["bins"].items()}, data["zero"])
+
+
+def _card_groups(set_name: str, rarity: str, supertype: str) -> List[tuple]:
+    return [("all", ""), ("set", set_name), ("rarity", rarity), ("supertype", supertype)]
+
+
+class MarketAggregates:
+    """
+    Market-wide price statistics, overall and per set, rarity and supertype.
+
+    refresh() folds the price store's newest observations into running
+    summaries: each changed card's previous price is taken out of its groups
+    and the new one put in. Readers get precomputed rows and never scan prices.
+    last_error holds the failure of the most recent background refresh, if any.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("SNAPPL_MARKET_AGGREGATES_PATH") or data_path("market_aggregates.db")
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def refresh(self, price_store: Optional[PriceHistoryStore] = None,
+                catalog: Optional[CardCatalog] = None) -> Dict:
+        """
+        Fold price observations recorded since the last refresh into the summaries.
+        """
+        price_store = price_store or get_price_history_store()
+        catalog = catalog or get_card_catalog()
+
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM aggregation_state WHERE key = 'price_seq_hwm'").fetchone()
+        high_water_mark = int(row["value"]) if row else 0
+
+        # The mark is the price store's write sequence, not ts, so observations
+        # recorded late with older timestamps are not skipped
+        new_mark = price_store.last_sequence()
+        if new_mark <= high_water_mark:
+            return {"success": True, "error": None, "data": {"cards": 0, "groups": 0}}
+        latest = price_store.latest_prices_since(high_water_mark, new_mark)
+
+        attributes = {}
+        card_ids = [card_id for card_id, _, _ in latest]
+        for start in range(0, len(card_ids), CATALOG_CHUNK):
+            attributes.update(catalog.get_cards(card_ids[start:start + CATALOG_CHUNK]))
+
+        with self._lock, self._conn:
+            previous = {}
+            for start in range(0, len(card_ids), CATALOG_CHUNK):
+                chunk = card_ids[start:start + CATALOG_CHUNK]
+                placeholders = ", ".join("?" for _ in chunk)
+                for old in self._conn.execute(
+                    f"SELECT * FROM market_latest WHERE card_id IN ({placeholders})", chunk
+                ):
+                    previous[old["card_id"]] = old
+
+            added: Dict[tuple, List[float]] = {}
+            removed: Dict[tuple, List[float]] = {}
+            upserts = []
+            for card_id, ts, price in latest:
+                old = previous.get(card_id)
+                if old is not None and old["ts"] > ts:
+                    continue
+                card = attributes.get(card_id, {})
+                new_row = (
+                    card_id, ts, price,
+                    card.get("set_name") or UNKNOWN_GROUP,
+                    card.get("rarity") or UNKNOWN_GROUP,
+                    card.get("supertype") or UNKNOWN_GROUP
+                )
+                if old is not None:
+                    if (old["price"], old["set_name"], old["rarity"], old["supertype"]) == (price,) + new_row[3:]:
+                        continue
+                    for group in _card_groups(old["set_name"], old["rarity"], old["supertype"]):
+                        removed.setdefault(group, []).append(old["price"])
+                for group in _card_groups(*new_row[3:]):
+                    added.setdefault(group, []).append(price)
+                upserts.append(new_row)
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO market_latest (card_id, ts, price, set_name, rarity, supertype) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                upserts
+            )
+            touched = set(added) | set(removed)
+            for group in touched:
+                self._update_summary(group, added.get(group, []), removed.get(group, []))
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO aggregation_state (key, value) VALUES ('price_seq_hwm', ?)",
+                (str(new_mark),)
+            )
+
+        return {"success": True, "error": None, "data": {"cards": len(upserts), "groups": len(touched)}}
+
+    def _update_summary(self, group: tuple, added: List[float], removed: List[float]):
+        group_by, group_key = group
+        row = self._conn.execute(
+            "SELECT count, total, sketch FROM market_summaries WHERE group_by = ? AND group_key = ?", group
+        ).fetchone()
+        count = row["count"] if row else 0
+        total = row["total"] if row else 0.0
+        sketch = QuantileSketch.from_json(row["sketch"]) if row else QuantileSketch()
+
+        count += len(added) - len(removed)
+        total += math.fsum(added) - math.fsum(removed)
+        sketch.add(added)
+        sketch.remove(removed)
+
+        if count <= 0:
+            self._conn.execute("DELETE FROM market_summaries WHERE group_by = ? AND group_key = ?", group)
+            return
+
+        # Extremes can't be un-merged, but the (group, price) indexes make them two seeks
+        if group_by == "all":
+            extremes = self._conn.execute("SELECT MIN(price), MAX(price) FROM market_latest").fetchone()
+        else:
+            extremes = self._conn.execute(
+                f"SELECT MIN(price), MAX(price) FROM market_latest WHERE {GROUP_COLUMNS[group_by]} = ?",
+                (group_key,)
+            ).fetchone()
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO market_summaries "
+            "(group_by, group_key, count, total, min_price, max_price, sketch, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (group_by, group_key, count, total, extremes[0], extremes[1], sketch.to_json(),
+             datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+
+    @staticmethod
+    def _row_to_stats(row: sqlite3.Row) -> Dict:
+        sketch = QuantileSketch.from_json(row["sketch"])
+        return {
+            "total_cards": row["count"],
+            "average_price": row["total"] / row["count"],
+            "lowest_price": row["min_price"],
+            "highest_price": row["max_price"],
+            "median_price": sketch.quantile(0.5),
+            "p10_price": sketch.quantile(0.1),
+            "p90_price": sketch.quantile(0.9),
+            "last_update": row["updated_at"]
+        }
+
+    def get_summary(self, group_by: Optional[str] = None) -> Optional[Dict]:
+        """
+        Return overall stats, plus a "groups" dict of per-group stats when
+        group_by is "set", "rarity" or "supertype"; None before the first refresh.
+        "refresh_error" is set when the latest background refresh failed, so
+        the stats may be out of date.
+        """
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"group_by must be one of {sorted(GROUP_COLUMNS)}")
+
+        with self._lock:
+            overall = self._conn.execute(
+                "SELECT * FROM market_summaries WHERE group_by = 'all' AND group_key = ''"
+            ).fetchone()
+            groups = self._conn.execute(
+                "SELECT * FROM market_summaries WHERE group_by = ? ORDER BY group_key", (group_by,)
+            ).fetchall() if group_by else []
+        if overall is None:
+            return None
+
+        summary = self._row_to_stats(overall)
+        summary["refresh_error"] = self.last_error
+        if group_by:
+            summary["groups"] = {row["group_key"]: self._row_to_stats(row) for row in groups}
+        return summary
+
+
+_aggregates: Optional[MarketAggregates] = None
+_aggregates_lock = threading.Lock()
+_refresh_thread: Optional[threading.Thread] = None
+
+
+def get_market_aggregates() -> MarketAggregates:
+    """
+    Return the process-wide market aggregates.
+    """
+    global _aggregates
+    if _aggregates is None:
+        with _aggregates_lock:
+            if _aggregates is None:
+                _aggregates = MarketAggregates()
+    return _aggregates
+
+
+def _refresh_loop(interval: float):
+    while True:
+        aggregates = None
+        try:
+            aggregates = get_market_aggregates()
+            aggregates.refresh()
+            aggregates.last_error = None
+        except Exception as e:
+            # Keep refreshing, but leave a trace instead of silently going stale
+            logger.exception("Market aggregate refresh failed")
+            if aggregates is not None:
+                aggregates.last_error = f"Refresh failed: {str(e)}"
+        time.sleep(interval)
+
+
+def start_market_aggregation(interval: Optional[float] = None):
+    """
+    Start refreshing the aggregates in a background thread (once per process),
+    every SNAPPL_MARKET_AGGREGATION_INTERVAL seconds (default 300).
+    """
+    global _refresh_thread
+    with _aggregates_lock:
+        if _refresh_thread is None:
+            interval = float(interval if interval is not None
+                             else os.environ.get("SNAPPL_MARKET_AGGREGATION_INTERVAL", 300))
+            _refresh_thread = threading.Thread(
+                target=_refresh_loop, args=(interval,), name="market-aggregation", daemon=True
+            )
+            _refresh_thread.start()
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.market_aggregates refresh
+    if sys.argv[1:] != ["refresh"]:
+        sys.exit("usage: python -m utils.market_aggregates refresh")
+    result = get_market_aggregates().refresh()
+    print(f"Updated {result['data']['cards']} card prices across {result['data']['groups']} groups")
@@ -1,17 +1,33 @@
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
 import streamlit as st
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.card_catalog import catalog_row_to_card, get_card_catalog
+from utils.http_client import get_http_session
+from utils.market_aggregates import get_market_aggregates, start_market_aggregation
+from utils.price_history import get_price_history_store, record_prices
+
+CARDS_URL = "https://api.pokemontcg.io/v2/cards"
+
+# Name clauses OR-ed into a single q= search, and parallel searches per batch
+MAX_NAMES_PER_QUERY = int(os.environ.get("POKEMON_TCG_NAMES_PER_QUERY", "10"))
+BATCH_WORKERS = int(os.environ.get("POKEMON_TCG_BATCH_WORKERS", "4"))
+MAX_PAGE_SIZE = 250
+MAX_IDS_PER_QUERY = 100
+# Catalog matches considered for one name; only the ids of pages actually read are priced
+MAX_CATALOG_MATCHES = 2 * MAX_PAGE_SIZE
 
 def _validate_api_key(api_key: str) -> Dict:
     """
     Validate the API key by making a test request.
     """
     try:
-        response = requests.get(
-            "https://api.pokemontcg.io/v2/cards",
+        response = get_http_session().get(
+            CARDS_URL,
             params={"pageSize": 1},
             headers={"X-Api-Key": api_key}
         )
@@ -25,11 +41,213 @@ def _validate_api_key(api_key: str) -> Dict:
     except Exception as e:
         return {"success": False, "error": f"Connection error: {str(e)}"}
 
+API_KEY_VALIDATION_TTL = int(os.environ.get("POKEMON_TCG_KEY_VALIDATION_TTL", "3600"))
+
+_validation_cache: Dict[str, Dict] = {}
+_validation_lock = threading.Lock()
+
+def _get_api_key_validation(api_key: str) -> Dict:
+    """
+    Return the cached validation result for an API key, probing the API
+    only when there is no unexpired entry for it.
+    """
+    now = time.monotonic()
+    with _validation_lock:
+        cached = _validation_cache.get(api_key)
+        if cached and cached["expires_at"] > now:
+            return cached["result"]
+
+    result = _validate_api_key(api_key)
+
+    # Transient failures are not cached so the next construction retries
+    if result["success"] or result["error"] == "Invalid API key":
+        with _validation_lock:
+            _validation_cache[api_key] = {
+                "result": result,
+                "expires_at": now + API_KEY_VALIDATION_TTL
+            }
+    return result
+
+def _invalidate_api_key(api_key: str):
+    """Drop a cached validation result, e.g. after the API answered 401."""
+    with _validation_lock:
+        _validation_cache.pop(api_key, None)
+
+class MarketDataError(Exception):
+    """Raised by the streaming fetchers when the API request fails."""
+
+def _known_prices(card_ids: List[str]) -> Dict[str, float]:
+    # Best-effort: without history the catalog order is used as is
+    try:
+        return get_price_history_store().latest_prices(card_ids)
+    except Exception:
+        return {}
+
+def _name_clause(card_name: str) -> str:
+    """Partial-match q= clause for a name, quoted so multi-word names stay one term."""
+    escaped = card_name.replace("\\", "\\\\").replace('"', '\\"')
+    return f'name:"*{escaped}*"'
+
+def _plan_card_search(card_name: str, page_size: int) -> Dict:
+    """
+    Decide how a name search is paged.
+
+    When the local catalog knows matching cards, the names are resolved
+    locally, ordered by their last recorded price (never-priced cards last),
+    and the remote API is only asked for the prices of one page of ids at a
+    time; otherwise the remote wildcard search is paged directly.
+    """
+    try:
+        rows = get_card_catalog().search(card_name, limit=MAX_CATALOG_MATCHES)
+    except Exception:
+        rows = []
+
+    if rows:
+        known = _known_prices([row["id"] for row in rows])
+        rows.sort(key=lambda row: (row["id"] in known, known.get(row["id"], 0)), reverse=True)
+        return {
+            "catalog_rows": {row["id"]: row for row in rows},
+            "card_ids": [row["id"] for row in rows],
+            "page_size": min(page_size, MAX_IDS_PER_QUERY)
+        }
+
+    return {
+        "catalog_rows": None,
+        "params": {
+            "q": _name_clause(card_name),  # Use partial matching to find all variants
+            "orderBy": "-cardmarket.prices.averageSellPrice",  # Sort by price descending
+            "pageSize": page_size
+        }
+    }
+
+def _id_chunks(card_ids: List[str]) -> List[List[str]]:
+    return [card_ids[i:i + MAX_IDS_PER_QUERY] for i in range(0, len(card_ids), MAX_IDS_PER_QUERY)]
+
+def _id_price_params(card_ids: List[str]) -> Dict:
+    """Query parameters asking for the prices of specific card ids."""
+    return {
+        "q": "(" + " OR ".join(f'id:"{card_id}"' for card_id in card_ids) + ")",
+        "select": "id,cardmarket",
+        "pageSize": len(card_ids)
+    }
+
+def _page_params(plan: Dict, page: int) -> Dict:
+    """Query parameters for one page of a search plan."""
+    if plan["catalog_rows"] is not None:
+        size = plan["page_size"]
+        return _id_price_params(plan["card_ids"][(page - 1) * size:page * size])
+    return {**plan["params"], "page": page}
+
+def _rank_catalog_cards(catalog_rows: Dict[str, Dict], priced: List[Dict]) -> List[Dict]:
+    """
+    Merge remote prices into local metadata, priciest first.
+    """
+    merged = []
+    for priced_card in priced:
+        row = catalog_rows.get(priced_card.get("id"))
+        if row is not None:
+            card = catalog_row_to_card(row)
+            card["cardmarket"] = priced_card.get("cardmarket")
+            merged.append(card)
+    merged.sort(
+        key=lambda card: (card.get("cardmarket") or {}).get("prices", {}).get("averageSellPrice") or 0,
+        reverse=True
+    )
+    return merged
+
+def _page_cards(plan: Dict, page: int, data: Dict) -> Dict:
+    """
+    Turn one page response into raw cards and whether more pages follow.
+    """
+    if plan["catalog_rows"] is not None:
+        cards = _rank_catalog_cards(plan["catalog_rows"], data.get("data", []))
+        return {"cards": cards, "has_more": page * plan["page_size"] < len(plan["card_ids"])}
+
+    cards = data.get("data", [])
+    has_more = bool(cards) and page * plan["params"]["pageSize"] < data.get("totalCount", 0)
+    return {"cards": cards, "has_more": has_more}
+
+def _get_cards_json(params: Dict, api_key: str) -> Dict:
+    response = get_http_session().get(CARDS_URL, params=params, headers={"X-Api-Key": api_key})
+    if response.status_code != 200:
+        if response.status_code == 401:
+            _invalidate_api_key(api_key)
+        raise MarketDataError(f"API Error: {response.status_code}")
+    return response.json()
+
+def _fetch_id_prices(card_ids: List[str], api_key: str) -> List[Dict]:
+    """
+    Fetch the prices of many card ids, MAX_IDS_PER_QUERY per concurrent request.
+    """
+    chunks = _id_chunks(card_ids)
+    if not chunks:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(chunks))) as executor:
+        pages = list(executor.map(lambda chunk: _get_cards_json(_id_price_params(chunk), api_key), chunks))
+    priced = [card for page in pages for card in page.get("data", [])]
+    record_prices(priced)
+    return priced
+
+def _fetch_cards_page(plan: Dict, page: int, api_key: str) -> Dict:
+    """Fetch one page of a search plan, returning raw cards and has_more."""
+    data = _get_cards_json(_page_params(plan, page), api_key)
+    record_prices(data.get("data", []))
+    return _page_cards(plan, page, data)
+
+def iter_card_market_data(card_name: str, api_key: str, limit: Optional[int] = None,
+                          page_size: int = MAX_PAGE_SIZE, prefetch: bool = False) -> Iterator[Dict]:
+    """
+    Lazily yield parsed variants of a card, walking the result pages.
+
+    Pages are requested only as the consumer advances; with prefetch=True the
+    next page is requested in the background while the current one is
+    consumed. Raises MarketDataError if a page request fails.
+    """
+    if not api_key:
+        raise MarketDataError("Pokemon TCG API key not found. Please check your configuration.")
+
+    if limit is not None:
+        page_size = max(1, min(page_size, limit))
+    plan = _plan_card_search(card_name, page_size)
+    search_name_lower = card_name.lower()
+    yielded = 0
+
+    # Not a with-block: closing the generator early must not wait for a prefetch
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = None
+    try:
+        page = 1
+        pending = executor.submit(_fetch_cards_page, plan, page, api_key)
+        while pending is not None:
+            result = pending.result()
+            pending = None
+            if result["has_more"] and prefetch:
+                pending = executor.submit(_fetch_cards_page, plan, page + 1, api_key)
+
+            for card in result["cards"]:
+                if card.get("cardmarket") and search_name_lower in card["name"].lower():
+                    yield _parse_card(card)
+                    yielded += 1
+                    if limit is not None and yielded >= limit:
+                        return
+
+            page += 1
+            if result["has_more"] and pending is None:
+                pending = executor.submit(_fetch_cards_page, plan, page, api_key)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
 @st.cache_data(ttl=300)  # Cache for 5 minutes
-def _fetch_card_market_data(card_name: str, api_key: str) -> Dict:
+def _fetch_card_market_data(card_name: str, api_key: str, limit: Optional[int] = None) -> Dict:
     """
     Fetch current market data for all variants of a specific Pokemon card.
     """
+    return _card_market_data(card_name, api_key, limit)
+
+def _card_market_data(card_name: str, api_key: str, limit: Optional[int] = None) -> Dict:
+    """Uncached body of _fetch_card_market_data."""
     if not api_key:
         return {
             "success": False,
@@ -38,71 +256,13 @@ def _fetch_card_market_data(card_name: str, api_key: str) -> Dict:
         }
 
     try:
-        # Clean the card name for the API query
-        query = f'name:*{card_name}*'  # Use partial matching to find all variants
-
-        # Make API request
-        response = requests.get(
-            "https://api.pokemontcg.io/v2/cards",
-            params={
-                "q": query,
-                "orderBy": "-cardmarket.prices.averageSellPrice",  # Sort by price descending
-                "pageSize": 20  # Get more results to include variants
-            },
-            headers={"X-Api-Key": api_key}
-        )
-
-        if response.status_code != 200:
-            return {
-                "success": False,
-                "error": f"API Error: {response.status_code}",
-                "data": None
-            }
-
-        data = response.json()
-
-        if not data.get("data"):
-            return {
-                "success": False,
-                "error": "No data found for this card",
-                "data": None
-            }
-
-        # Process all matching cards
-        cards_data = []
-        search_name_lower = card_name.lower()
-
-        for card in data["data"]:
-            if card.get("cardmarket") and search_name_lower in card["name"].lower():
-                card_info = {
-                    "card_name": card["name"],
-                    "set": card.get("set", {}).get("name", "Unknown"),
-                    "current_price": card.get("cardmarket", {}).get("prices", {}).get("averageSellPrice", 0),
-                    "image_url": card.get("images", {}).get("large") or card.get("images", {}).get("small"),
-                    "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "trend": _calculate_price_trend(card),
-                    "availability": _get_availability_status(card),
-                    "rarity": card.get("rarity", "Unknown"),
-                    "supertype": card.get("supertype", "Unknown"),
-                    "subtypes": ", ".join(card.get("subtypes", [])),
-                    "number": card.get("number", "N/A"),
-                    "artist": card.get("artist", "Unknown")
-                }
-                cards_data.append(card_info)
-
-        if not cards_data:
-            return {
-                "success": False,
-                "error": "No market data available for this card",
-                "data": None
-            }
-
+        cards_data = list(iter_card_market_data(card_name, api_key, limit=limit, prefetch=True))
+    except MarketDataError as e:
         return {
-            "success": True,
-            "error": None,
-            "data": cards_data  # Return list of all variants
+            "success": False,
+            "error": str(e),
+            "data": None
         }
-
     except Exception as e:
         return {
             "success": False,
@@ -110,6 +270,185 @@ def _fetch_card_market_data(card_name: str, api_key: str) -> Dict:
             "data": None
         }
 
+    if not cards_data:
+        return {
+            "success": False,
+            "error": "No market data available for this card",
+            "data": None
+        }
+
+    return {
+        "success": True,
+        "error": None,
+        "data": cards_data  # Return list of all variants
+    }
+
+@st.cache_data(ttl=300)  # Cache for 5 minutes
+def _fetch_card_market_data_by_id(card_id: str, api_key: str) -> Dict:
+    """
+    Fetch current market data for one exact catalog card.
+    """
+    if not api_key:
+        return {
+            "success": False,
+            "error": "Pokemon TCG API key not found. Please check your configuration.",
+            "data": None
+        }
+
+    try:
+        rows = get_card_catalog().get_cards([card_id])
+        cards = [
+            card for card in _rank_catalog_cards(rows, _fetch_id_prices([card_id], api_key))
+            if card.get("cardmarket")
+        ]
+    except MarketDataError as e:
+        return {"success": False, "error": str(e), "data": None}
+    except Exception as e:
+        return {"success": False, "error": f"Error fetching market data: {str(e)}", "data": None}
+
+    return _variants_result([_parse_card(card) for card in cards])
+
+def _parse_card(card: Dict) -> Dict:
+    """Convert a raw API card into the variant dict used by the UI."""
+    return {
+        "card_id": card.get("id"),
+        "card_name": card["name"],
+        "set": card.get("set", {}).get("name", "Unknown"),
+        "current_price": card.get("cardmarket", {}).get("prices", {}).get("averageSellPrice", 0),
+        "image_url": card.get("images", {}).get("large") or card.get("images", {}).get("small"),
+        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "trend": _calculate_price_trend(card),
+        "availability": _get_availability_status(card),
+        "rarity": card.get("rarity", "Unknown"),
+        "supertype": card.get("supertype", "Unknown"),
+        "subtypes": ", ".join(card.get("subtypes", [])),
+        "number": card.get("number", "N/A"),
+        "artist": card.get("artist", "Unknown")
+    }
+
+def _variants_result(variants: List[Dict]) -> Dict:
+    if variants:
+        return {"success": True, "error": None, "data": variants}
+    return {
+        "success": False,
+        "error": "No market data available for this card",
+        "data": None
+    }
+
+def _fetch_catalog_batch(plans: Dict[str, Dict], api_key: str, limit: Optional[int]) -> Dict[str, Dict]:
+    """
+    Price the catalog matches of several names at once and rank them per name.
+
+    With a limit only each name's first `limit` candidates (by last recorded
+    price) are priced, together in as few requests as possible; a name left
+    short because some of those have no market data is looked up on its own.
+    """
+    candidates = {
+        name: plan["card_ids"][:limit] if limit is not None else plan["card_ids"]
+        for name, plan in plans.items()
+    }
+    card_ids = list({card_id: None for ids in candidates.values() for card_id in ids})
+    try:
+        priced = _fetch_id_prices(card_ids, api_key)
+    except Exception as e:
+        error = str(e) if isinstance(e, MarketDataError) else f"Error fetching market data: {str(e)}"
+        return {name: {"success": False, "error": error, "data": None} for name in plans}
+
+    results = {}
+    for name, plan in plans.items():
+        name_lower = name.lower()
+        variants = [
+            _parse_card(card) for card in _rank_catalog_cards(plan["catalog_rows"], priced)
+            if card.get("cardmarket") and name_lower in card["name"].lower()
+        ]
+        if limit is not None and len(variants) < limit < len(plan["card_ids"]):
+            results[name] = _card_market_data(name, api_key, limit)
+        else:
+            results[name] = _variants_result(variants[:limit] if limit is not None else variants)
+    return results
+
+def _fetch_name_batch(card_names: List[str], api_key: str, limit: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Run one OR-combined name search and split the matches per requested name.
+
+    The combined search returns at most one page; when it was truncated,
+    only the names it left unresolved (no variants, or fewer than `limit`)
+    are searched on their own.
+    """
+    query = " OR ".join(_name_clause(name) for name in card_names)
+
+    try:
+        data = _get_cards_json(
+            {
+                "q": f"({query})",
+                "orderBy": "-cardmarket.prices.averageSellPrice",
+                "pageSize": MAX_PAGE_SIZE
+            },
+            api_key
+        )
+        cards = data.get("data", [])
+        record_prices(cards)
+    except Exception as e:
+        error = str(e) if isinstance(e, MarketDataError) else f"Error fetching market data: {str(e)}"
+        return {name: {"success": False, "error": error, "data": None} for name in card_names}
+
+    matches = {name: [] for name in card_names}
+    for card in cards:
+        if not card.get("cardmarket"):
+            continue
+        card_name_lower = card["name"].lower()
+        parsed = None
+        for name in card_names:
+            if name.lower() in card_name_lower:
+                parsed = parsed or _parse_card(card)
+                matches[name].append(parsed)
+
+    truncated = data.get("totalCount", 0) > len(cards)
+    results = {}
+    for name, variants in matches.items():
+        if truncated and (not variants or (limit is not None and len(variants) < limit)):
+            results[name] = _card_market_data(name, api_key, limit)
+        else:
+            results[name] = _variants_result(variants[:limit] if limit is not None else variants)
+    return results
+
+@st.cache_data(ttl=300)  # Cache for 5 minutes
+def _fetch_card_market_data_many(card_names: tuple, api_key: str, limit: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Fetch market data for several card names with as few requests as possible.
+
+    Names the local catalog knows are resolved to ids and priced together;
+    the rest are OR-combined into remote name searches.
+    """
+    if not api_key:
+        error = "Pokemon TCG API key not found. Please check your configuration."
+        return {name: {"success": False, "error": error, "data": None} for name in card_names}
+
+    catalog_plans = {}
+    remote_names = []
+    for name in dict.fromkeys(card_names):
+        plan = _plan_card_search(name, MAX_PAGE_SIZE)
+        if plan["catalog_rows"] is not None:
+            catalog_plans[name] = plan
+        else:
+            remote_names.append(name)
+
+    batches = [
+        remote_names[i:i + MAX_NAMES_PER_QUERY]
+        for i in range(0, len(remote_names), MAX_NAMES_PER_QUERY)
+    ]
+    if not batches and not catalog_plans:
+        return {}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(batches) + 1)) as executor:
+        catalog_future = executor.submit(_fetch_catalog_batch, catalog_plans, api_key, limit) if catalog_plans else None
+        for batch_result in executor.map(lambda batch: _fetch_name_batch(batch, api_key, limit), batches):
+            results.update(batch_result)
+        if catalog_future is not None:
+            results.update(catalog_future.result())
+    return results
+
 def _calculate_price_trend(card_data: Dict) -> str:
     """Calculate price trend based on historical data."""
     prices = card_data.get("cardmarket", {}).get("prices", {})
@@ -153,23 +492,68 @@ class PokemonMarketData:
                 self.api_key = ""
                 return
 
-        # Validate API key
-        validation_result = _validate_api_key(self.api_key)
+        # Validate API key (cached process-wide, revalidated on TTL expiry or 401)
+        validation_result = _get_api_key_validation(self.api_key)
         if not validation_result["success"]:
             st.error(f"API key validation failed: {validation_result['error']}")
             self.api_key = ""
 
-    def get_card_market_data(self, card_name: str) -> Dict:
+    def get_card_market_data(self, card_name: str, limit: Optional[int] = None) -> Dict:
         """
         Fetch current market data for all variants of a specific Pokemon card.
         """
-        return _fetch_card_market_data(card_name, self.api_key)
+        return _fetch_card_market_data(card_name, self.api_key, limit)
+
+    def get_card_market_data_by_id(self, card_id: str) -> Dict:
+        """
+        Fetch current market data for one exact card, e.g. an image match.
+        """
+        return _fetch_card_market_data_by_id(card_id, self.api_key)
+
+    def iter_card_market_data(self, card_name: str, limit: Optional[int] = None,
+                              prefetch: bool = True) -> Iterator[Dict]:
+        """
+        Stream variants of a card page by page (see iter_card_market_data).
+        """
+        return iter_card_market_data(card_name, self.api_key, limit=limit, prefetch=prefetch)
+
+    def get_card_market_data_many(self, card_names: List[str], limit: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Fetch market data for many card names at once, keyed by name.
 
-    def get_market_trends(self) -> Dict:
+        Names are deduplicated and OR-combined into batched searches that run
+        concurrently; each value has the same shape as get_card_market_data(),
+        keeping at most `limit` variants per name.
+        """
+        unique_names = tuple(sorted({name for name in card_names if name}))
+        return _fetch_card_market_data_many(unique_names, self.api_key, limit)
+
+    def get_market_trends(self, group_by: Optional[str] = None) -> Dict:
         """
         Get overall market trends and statistics.
+
+        Numbers come from the precomputed aggregates over every tracked card
+        (with per-group stats under "groups" when group_by is "set", "rarity"
+        or "supertype"); until the first aggregation has run, the remote
+        sample is used instead.
         """
-        return _fetch_market_trends(self.api_key)
+        return get_market_trends_summary(self.api_key, group_by)
+
+def get_market_trends_summary(api_key: str, group_by: Optional[str] = None) -> Dict:
+    """
+    Read the precomputed market aggregates, falling back to the remote sample.
+    """
+    start_market_aggregation()
+    try:
+        summary = get_market_aggregates().get_summary(group_by)
+    except ValueError as e:
+        return {"success": False, "error": str(e), "data": None}
+    except Exception:
+        summary = None
+
+    if summary is not None:
+        return {"success": True, "error": None, "data": summary}
+    return _fetch_market_trends(api_key)
 
 @st.cache_data(ttl=3600)  # Cache for 1 hour
 def _fetch_market_trends(api_key: str) -> Dict:
@@ -184,53 +568,58 @@ def _fetch_market_trends(api_key: str) -> Dict:
         }
 
     try:
-        response = requests.get(
-            "https://api.pokemontcg.io/v2/cards",
+        response = get_http_session().get(
+            CARDS_URL,
             params={"pageSize": 100, "orderBy": "set.releaseDate"},
             headers={"X-Api-Key": api_key}
         )
 
         if response.status_code != 200:
+            if response.status_code == 401:
+                _invalidate_api_key(api_key)
             return {
                 "success": False,
                 "error": f"API Error: {response.status_code}",
                 "data": None
             }
 
-        data = response.json()
-
-        # Calculate market metrics
-        cards = data.get("data", [])
-        prices = [
-            card.get("cardmarket", {}).get("prices", {}).get("averageSellPrice", 0)
-            for card in cards
-            if card.get("cardmarket")
-        ]
-
-        if not prices:
-            return {
-                "success": False,
-                "error": "No price data available",
-                "data": None
-            }
-
-        metrics = {
-            "total_cards": len(cards),
-            "average_price": sum(prices) / len(prices) if prices else 0,
-            "highest_price": max(prices) if prices else 0,
-            "lowest_price": min(prices) if prices else 0,
-            "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        return _build_market_trends_result(response.json().get("data", []))
 
+    except Exception as e:
         return {
-            "success": True,
-            "error": None,
-            "data": metrics
+            "success": False,
+            "error": f"Error fetching market trends: {str(e)}",
+            "data": None
         }
 
-    except Exception as e:
+def _build_market_trends_result(cards: List[Dict]) -> Dict:
+    """
+    Build the get_market_trends() result from raw API cards.
+    """
+    # Calculate market metrics
+    prices = [
+        card.get("cardmarket", {}).get("prices", {}).get("averageSellPrice", 0)
+        for card in cards
+        if card.get("cardmarket")
+    ]
+
+    if not prices:
         return {
             "success": False,
-            "error": f"Error fetching market trends: {str(e)}",
+            "error": "No price data available",
             "data": None
-        }
\ No newline at end of file
+        }
+
+    metrics = {
+        "total_cards": len(cards),
+        "average_price": sum(prices) / len(prices) if prices else 0,
+        "highest_price": max(prices) if prices else 0,
+        "lowest_price": min(prices) if prices else 0,
+        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    return {
+        "success": True,
+        "error": None,
+        "data": metrics
+    }
@@ -0,0 +1,133 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.card_catalog import CardCatalog, get_card_catalog
+
+# Candidates shortlisted by shared trigrams before computing edit distances
+MAX_CANDIDATES = 50
+# Allowed edits as a share of the name's length (at least one edit)
+MAX_EDIT_RATIO = 0.3
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lowercase and collapse anything that is not a letter or digit to single spaces.
+    """
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", ascii_name.lower()).split())
+
+
+def _trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Edit distance between a and b, or None as soon as it must exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+        if min(current) > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class NameMatcher:
+    """
+    In-memory fuzzy lookup from noisy OCR text to canonical card names.
+
+    A trigram index shortlists names sharing the most trigrams with the query,
+    and only that shortlist is checked with a bounded edit distance.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = sorted(set(names))
+        self._normalized = [normalize_name(name) for name in self.names]
+        self._exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        for index, normalized in enumerate(self._normalized):
+            self._exact.setdefault(normalized, index)
+            for trigram in _trigrams(normalized):
+                postings.setdefault(trigram, []).append(index)
+        self._postings = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def match(self, text: str, limit: int = 1) -> List[Dict]:
+        """
+        Return up to `limit` names within the edit budget as {"name", "distance"}, closest first.
+        """
+        query = normalize_name(text)
+        if not query or not self.names:
+            return []
+        if query in self._exact:
+            return [{"name": self.names[self._exact[query]], "distance": 0}]
+
+        hits = [self._postings[t] for t in _trigrams(query) if t in self._postings]
+        if not hits:
+            return []
+        counts = np.bincount(np.concatenate(hits), minlength=len(self.names))
+        shortlist_size = min(MAX_CANDIDATES, int(np.count_nonzero(counts)))
+        shortlist = np.argpartition(-counts, shortlist_size - 1)[:shortlist_size]
+
+        max_distance = max(1, int(len(query) * MAX_EDIT_RATIO))
+        matches = []
+        for index in shortlist:
+            distance = bounded_levenshtein(query, self._normalized[index], max_distance)
+            if distance is not None:
+                matches.append({"name": self.names[index], "distance": distance})
+        matches.sort(key=lambda match: (match["distance"], match["name"]))
+        return matches[:limit]
+
+
+_matcher: Optional[NameMatcher] = None
+_matcher_size: Optional[int] = None
+_matcher_lock = threading.Lock()
+
+
+def get_name_matcher(catalog: Optional[CardCatalog] = None) -> NameMatcher:
+    """
+    Return the matcher over the catalog's names, rebuilt when the catalog grows.
+    """
+    global _matcher, _matcher_size
+    catalog = catalog or get_card_catalog()
+    size = catalog.count()
+    with _matcher_lock:
+        if _matcher is None or size != _matcher_size:
+            _matcher = NameMatcher(catalog.get_names())
+            _matcher_size = size
+    return _matcher
+
+
+def resolve_card_name(text: str) -> Dict:
+    """
+    Map an OCR'd name to a canonical catalog name before any remote search.
+
+    Returns {"success", "error", "data"} where data is the canonical name.
+    Without a local catalog there is nothing to check against, so the text
+    is passed through unchanged.
+    """
+    matcher = get_name_matcher()
+    if not len(matcher):
+        return {"success": True, "error": None, "data": text.strip()}
+
+    matches = matcher.match(text)
+    if not matches:
+        return {"success": False, "error": f"No known card name resembles '{text}'", "data": None}
+    return {"success": True, "error": None, "data": matches[0]["name"]}
@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_history (
+    card_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    average_sell_price REAL,
+    avg7 REAL,
+    avg30 REAL,
+    trend_price REAL,
+    seq INTEGER,
+    PRIMARY KEY (card_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS price_history_seq ON price_history(seq);
+CREATE TABLE IF NOT EXISTS price_rollups (
+    card_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    first_ts INTEGER,
+    last_ts INTEGER,
+    samples INTEGER,
+    PRIMARY KEY (card_id, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+# Rollup resolutions kept in step with every append, in seconds per bucket
+ROLLUP_RESOLUTIONS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+MAX_CHART_POINTS = 2000
+
+_ROLLUP_UPSERT = """
+INSERT INTO price_rollups
+    (card_id, resolution, bucket, open, high, low, close, first_ts, last_ts, samples)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(card_id, resolution, bucket) DO UPDATE SET
+    open = CASE WHEN excluded.first_ts < first_ts THEN excluded.open ELSE open END,
+    close = CASE WHEN excluded.last_ts >= last_ts THEN excluded.close ELSE close END,
+    high = max(high, excluded.high),
+    low = min(low, excluded.low),
+    first_ts = min(first_ts, excluded.first_ts),
+    last_ts = max(last_ts, excluded.last_ts),
+    samples = samples + 1
+"""
+
+_PRICE_FIELDS = ("averageSellPrice", "avg7", "avg30", "trendPrice")
+
+# seq numbers rows in write order (the table has no rowid); evaluated per row
+# inside the write transaction, so it only ever grows, across processes too
+_PRICE_INSERT = """
+INSERT OR REPLACE INTO price_history
+    (card_id, ts, average_sell_price, avg7, avg30, trend_price, seq)
+VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM price_history))
+"""
+
+
+class PriceHistoryStore:
+    """
+    Append-only store of observed card prices.
+
+    Rows are clustered on (card_id, ts), so the history of one card over a
+    time range is a single contiguous index range scan.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("SNAPPL_PRICE_HISTORY_PATH") or data_path("price_history.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def append(self, rows: List[tuple]) -> int:
+        """
+        Append (card_id, ts, averageSellPrice, avg7, avg30, trendPrice) rows
+        in one transaction.
+        """
+        if not rows:
+            return 0
+
+        with self._lock, self._conn:
+            # A row replacing an existing (card_id, ts) can't be folded into the
+            # OHLC incrementally: its buckets are recomputed from the raw rows
+            seen = set()
+            inserted, replaced = [], set()
+            for card_id, ts, price, *_ in rows:
+                exists = (card_id, ts) in seen or self._conn.execute(
+                    "SELECT 1 FROM price_history WHERE card_id = ? AND ts = ?", (card_id, ts)
+                ).fetchone() is not None
+                seen.add((card_id, ts))
+                if exists:
+                    replaced.update(
+                        (card_id, resolution, ts // seconds) for resolution, seconds in ROLLUP_RESOLUTIONS.items()
+                    )
+                elif price is not None:
+                    inserted.extend(
+                        (card_id, resolution, ts // seconds, price, price, price, price, ts, ts)
+                        for resolution, seconds in ROLLUP_RESOLUTIONS.items()
+                    )
+
+            self._conn.executemany(_PRICE_INSERT, rows)
+            # OHLC rollups over averageSellPrice, updated in the same transaction
+            self._conn.executemany(_ROLLUP_UPSERT, inserted)
+            for card_id, resolution, bucket in replaced:
+                self._rebuild_rollup(card_id, resolution, bucket)
+        return len(rows)
+
+    def _rebuild_rollup(self, card_id: str, resolution: str, bucket: int):
+        seconds = ROLLUP_RESOLUTIONS[resolution]
+        prices = self._conn.execute(
+            "SELECT ts, average_sell_price FROM price_history "
+            "WHERE card_id = ? AND ts BETWEEN ? AND ? AND average_sell_price IS NOT NULL ORDER BY ts",
+            (card_id, bucket * seconds, (bucket + 1) * seconds - 1)
+        ).fetchall()
+        if not prices:
+            self._conn.execute(
+                "DELETE FROM price_rollups WHERE card_id = ? AND resolution = ? AND bucket = ?",
+                (card_id, resolution, bucket)
+            )
+            return
+        values = [price for _, price in prices]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO price_rollups "
+            "(card_id, resolution, bucket, open, high, low, close, first_ts, last_ts, samples) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (card_id, resolution, bucket, values[0], max(values), min(values), values[-1],
+             prices[0][0], prices[-1][0], len(prices))
+        )
+
+    def record_cards(self, cards: List[Dict], ts: Optional[int] = None) -> int:
+        """
+        Append one price observation for every raw API card with market data.
+        """
+        ts = int(ts if ts is not None else time.time())
+        rows = []
+        for card in cards:
+            prices = (card.get("cardmarket") or {}).get("prices")
+            if card.get("id") and prices:
+                rows.append((card["id"], ts) + tuple(prices.get(field) for field in _PRICE_FIELDS))
+        return self.append(rows)
+
+    def last_sequence(self) -> int:
+        """Write sequence number of the most recently written row (0 if none)."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM price_history").fetchone()[0]
+
+    def latest_prices_since(self, after_seq: int, through_seq: Optional[int] = None) -> List[tuple]:
+        """
+        Return (card_id, ts, averageSellPrice) of each card's newest priced
+        observation among the rows written after after_seq (up to through_seq).
+
+        Going by write order rather than ts also picks up late-arriving or
+        backfilled observations with old timestamps.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT card_id, MAX(ts), average_sell_price FROM price_history "
+                "WHERE seq > ? AND seq <= ? AND average_sell_price IS NOT NULL GROUP BY card_id",
+                (after_seq, through_seq if through_seq is not None else 2 ** 63 - 1)
+            ).fetchall()
+
+    def latest_prices(self, card_ids: List[str]) -> Dict[str, float]:
+        """
+        Return the newest recorded averageSellPrice of each given card that has one.
+        """
+        prices = {}
+        with self._lock:
+            for start in range(0, len(card_ids), 500):
+                chunk = card_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                prices.update(
+                    (card_id, price) for card_id, _, price in self._conn.execute(
+                        "SELECT card_id, MAX(ts), average_sell_price FROM price_history "
+                        f"WHERE card_id IN ({placeholders}) AND average_sell_price IS NOT NULL GROUP BY card_id",
+                        chunk
+                    )
+                )
+        return prices
+
+    def _choose_resolution(self, card_id: str, start_ts: int, end_ts: int, max_points: int) -> str:
+        with self._lock:
+            raw_count = self._conn.execute(
+                "SELECT COUNT(*) FROM price_history WHERE card_id = ? AND ts BETWEEN ? AND ?",
+                (card_id, start_ts, end_ts)
+            ).fetchone()[0]
+        if raw_count <= max_points:
+            return "raw"
+        for resolution, seconds in sorted(ROLLUP_RESOLUTIONS.items(), key=lambda item: item[1]):
+            if (end_ts - start_ts) // seconds + 1 <= max_points:
+                return resolution
+        return max(ROLLUP_RESOLUTIONS, key=ROLLUP_RESOLUTIONS.get)
+
+    def get_history(self, card_id: str, days: int = 30, end: Optional[float] = None,
+                    resolution: str = "raw", max_points: int = MAX_CHART_POINTS) -> pd.DataFrame:
+        """
+        Return a card's observations over the last `days` days, oldest first.
+
+        With resolution="raw" the frame has `date` and `price` columns (price =
+        averageSellPrice) as expected by create_price_history_chart, plus avg7,
+        avg30 and trend_price. "hour", "day" and "week" read the precomputed
+        OHLC rollups instead (price = close, with each bucket's high and low
+        so charts can keep spikes); "auto" picks the finest resolution that
+        fits in max_points.
+        """
+        end_ts = int(end if end is not None else time.time())
+        start_ts = end_ts - days * 86400
+        if resolution == "auto":
+            resolution = self._choose_resolution(card_id, start_ts, end_ts, max_points)
+
+        if resolution != "raw":
+            return self._get_rollups(card_id, resolution, start_ts, end_ts)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, average_sell_price, avg7, avg30, trend_price FROM price_history "
+                "WHERE card_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (card_id, start_ts, end_ts)
+            ).fetchall()
+
+        values = np.array(rows, dtype=float).reshape(-1, 5)
+        return pd.DataFrame({
+            "date": pd.to_datetime(values[:, 0].astype(np.int64), unit="s"),
+            "price": values[:, 1],
+            "avg7": values[:, 2],
+            "avg30": values[:, 3],
+            "trend_price": values[:, 4],
+        })
+
+    def _get_rollups(self, card_id: str, resolution: str, start_ts: int, end_ts: int) -> pd.DataFrame:
+        seconds = ROLLUP_RESOLUTIONS[resolution]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket, open, high, low, close FROM price_rollups "
+                "WHERE card_id = ? AND resolution = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (card_id, resolution, start_ts // seconds, end_ts // seconds)
+            ).fetchall()
+
+        values = np.array(rows, dtype=float).reshape(-1, 5)
+        return pd.DataFrame({
+            "date": pd.to_datetime(values[:, 0].astype(np.int64) * seconds, unit="s"),
+            "open": values[:, 1],
+            "high": values[:, 2],
+            "low": values[:, 3],
+            "close": values[:, 4],
+            "price": values[:, 4],
+        })
+
+
+_store: Optional[PriceHistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_price_history_store() -> PriceHistoryStore:
+    """
+    Return the process-wide price history store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PriceHistoryStore()
+    return _store
+
+
+def record_prices(cards: List[Dict]):
+    """
+    Best-effort hook for fetchers: history must never break a price lookup.
+    """
+    try:
+        get_price_history_store().record_cards(cards)
+    except Exception:
+        pass
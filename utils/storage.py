@@ -0,0 +1,10 @@
+import os
+
+DATA_DIR = os.environ.get("SNAPPL_DATA_DIR", "data")
+
+def data_path(filename: str) -> str:
+    """
+    Return the path of a local data file, creating the data directory.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)